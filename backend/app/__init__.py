@@ -4,18 +4,36 @@ from flask_cors import CORS
 from .config import Config
 from .extensions import db, migrate, jwt
 
-def create_app(config_class=Config):
+def _create_base_app(config_class):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
-    # Initialize extensions
+    # Initialize the database (engine options come from the DB_PROFILE)
+    from . import database
+    database.configure(app)
     db.init_app(app)
+    database.init_app(app, db)
+    return app
+
+def create_job_app(config_class=Config):
+    """
+    Minimal app for background job processes: config, database and templates only.
+    No routes or face services are imported, so a CSV export does not load DeepFace.
+    """
+    return _create_base_app(config_class)
+
+def create_app(config_class=Config):
+    app = _create_base_app(config_class)
     migrate.init_app(app, db)
     jwt.init_app(app)
+
+    from .services.auth_service import role_required, user_status_cache
+    user_status_cache.init_app(app)
     
-    # Initialize mail
-    from .services.email_service import mail
+    # Initialize mail and the outbound mail queue (its worker starts in start_services)
+    from .services.email_service import mail, email_worker
     mail.init_app(app)
+    email_worker.init_app(app)
     
     @jwt.invalid_token_loader
     def invalid_token_callback(error):
@@ -32,6 +50,21 @@ def create_app(config_class=Config):
     # Ensure upload directory exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+    from .services.model_registry import ModelRegistry
+
+    # Coalesce concurrent mark requests into batched inference (started in start_services)
+    from .services.inference_batcher import inference_batcher
+    inference_batcher.init_app(app)
+
+    from .services.roster_cache import roster_cache
+    roster_cache.init_app(app)
+
+    from .services.face_index import face_index
+    face_index.init_app(app)
+
+    from .services.job_runner import job_runner
+    job_runner.init_app(app)
+
     # Register blueprints
     from .routes import auth_routes, class_routes, attendance_routes, admin_routes
     app.register_blueprint(auth_routes.bp)
@@ -41,6 +74,46 @@ def create_app(config_class=Config):
 
     @app.route('/health')
     def health_check():
-        return {'status': 'healthy', 'service': 'face-attendance-backend'}
+        return {
+            'status': 'healthy',
+            'service': 'face-attendance-backend',
+            'db_profile': app.config['DB_PROFILE_ACTIVE'],
+            'models_ready': ModelRegistry.is_ready(),
+            'models': ModelRegistry.status()
+        }
+
+    @app.route('/metrics')
+    @role_required('admin')
+    def metrics():
+        return {
+            'inference': inference_batcher.metrics(),
+            'roster_cache': roster_cache.metrics(),
+            'face_index': face_index.metrics(),
+            'email': email_worker.metrics(),
+            'auth_cache': user_status_cache.metrics()
+        }
 
     return app
+
+def start_services(app):
+    """
+    Starts what only a serving process needs: the face model warm-up, the
+    inference batcher and the outbound mail worker (each behind its config
+    flag) and the job dispatcher.
+    Called by the server entry points (run.py, wsgi.py), so CLI commands and
+    scripts that build the app (flask db upgrade, seed.py, ...) stay light.
+    """
+    from .services.model_registry import ModelRegistry
+    from .services.inference_batcher import inference_batcher
+    from .services.email_service import email_worker
+    from .services.job_runner import job_runner
+
+    # Load face models once per worker so requests reuse the in-memory graphs
+    if app.config.get('DEEPFACE_PRELOAD'):
+        ModelRegistry.warm_up()
+    if app.config.get('INFERENCE_BATCHING'):
+        inference_batcher.start()
+    if app.config.get('EMAIL_WORKER'):
+        email_worker.start()
+    # Fails jobs orphaned by a previous process, then claims queued jobs up to JOB_MAX_WORKERS
+    job_runner.start()
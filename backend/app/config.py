@@ -9,13 +9,62 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-prod'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///attendance.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Engine tuning profile: auto, sqlite (WAL), postgres or default (see app/database.py)
+    DB_PROFILE = os.environ.get('DB_PROFILE') or 'auto'
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)  # seconds
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)  # seconds
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 30000)
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-prod'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    # Seconds a user's role/active status is cached for JWT checks (see role_required)
+    AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL') or 60)
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'app', 'static', 'uploads')
     
     # DeepFace Configuration
     DEEPFACE_MODEL = 'ArcFace'
     DEEPFACE_METRIC = 'cosine'
+    DEEPFACE_DETECTOR = 'ssd'
+    # Cosine distance below which a face counts as a match.
+    # Stricter threshold for ArcFace + Cosine (typical range: 0.4-0.68);
+    # 0.50 for better security while maintaining usability
+    FACE_MATCH_THRESHOLD = 0.50
+    # Build the models when a worker starts serving (start_services) instead of on the first request
+    DEEPFACE_PRELOAD = os.environ.get('DEEPFACE_PRELOAD', 'True') == 'True'
+
+    # Micro-batching of /api/attendance/mark inference
+    INFERENCE_BATCHING = os.environ.get('INFERENCE_BATCHING', 'True') == 'True'
+    INFERENCE_BATCH_WINDOW_MS = int(os.environ.get('INFERENCE_BATCH_WINDOW_MS') or 10)
+    INFERENCE_MAX_BATCH = int(os.environ.get('INFERENCE_MAX_BATCH') or 16)
+    INFERENCE_TIMEOUT = int(os.environ.get('INFERENCE_TIMEOUT') or 30)  # seconds
+
+    # Per-process cache of class roster embeddings for active sessions
+    ROSTER_CACHE_MAX_SESSIONS = int(os.environ.get('ROSTER_CACHE_MAX_SESSIONS') or 256)
+    # Seconds a cached roster is trusted before its face versions are re-checked against the DB
+    ROSTER_CACHE_REFRESH_INTERVAL = int(os.environ.get('ROSTER_CACHE_REFRESH_INTERVAL') or 10)
+
+    # Campus-wide face search index: 'ivf' (approximate) or 'exact' (brute force)
+    FACE_INDEX_BACKEND = os.environ.get('FACE_INDEX_BACKEND') or 'ivf'
+    FACE_INDEX_PATH = os.environ.get('FACE_INDEX_PATH') or os.path.join(os.getcwd(), 'instance', 'face_index.npz')
+    FACE_INDEX_NPROBE = int(os.environ.get('FACE_INDEX_NPROBE') or 16)
+    FACE_INDEX_SAVE_INTERVAL = int(os.environ.get('FACE_INDEX_SAVE_INTERVAL') or 60)  # seconds
+    # Seconds between checks of the index against users.face_version (picks up other workers' changes)
+    FACE_INDEX_REFRESH_INTERVAL = int(os.environ.get('FACE_INDEX_REFRESH_INTERVAL') or 30)
+
+    # Attendance exports hold back rows newer than this many seconds, so marks that
+    # commit late (after waiting for the write lock) are not skipped by incremental pulls
+    EXPORT_WATERMARK_LAG = int(os.environ.get('EXPORT_WATERMARK_LAG') or 120)
+
+    # Background jobs (exports, bulk operations) run in a local process pool;
+    # JOB_MAX_WORKERS caps running jobs across all web processes
+    JOB_MAX_WORKERS = int(os.environ.get('JOB_MAX_WORKERS') or 2)
+    JOB_OUTPUT_FOLDER = os.environ.get('JOB_OUTPUT_FOLDER') or os.path.join(os.getcwd(), 'instance', 'jobs')
+    JOB_POLL_INTERVAL = int(os.environ.get('JOB_POLL_INTERVAL') or 5)  # seconds between checks for queued jobs
+    # Seconds between job heartbeats; jobs of a process that missed 3 beats are marked failed
+    JOB_HEARTBEAT_INTERVAL = int(os.environ.get('JOB_HEARTBEAT_INTERVAL') or 30)
+    # Job results (and partial output) older than this are deleted
+    JOB_RESULT_RETENTION_DAYS = int(os.environ.get('JOB_RESULT_RETENTION_DAYS') or 7)
     
     # Email Configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
@@ -25,3 +74,17 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')  # Your Gmail address
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')  # Your Gmail App Password
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or os.environ.get('MAIL_USERNAME')
+
+    # Low-attendance warnings (send_low_attendance_notifications.py / low_attendance_notifications job)
+    LOW_ATTENDANCE_THRESHOLD = float(os.environ.get('LOW_ATTENDANCE_THRESHOLD') or 75)  # percent
+    LOW_ATTENDANCE_MIN_SESSIONS = int(os.environ.get('LOW_ATTENDANCE_MIN_SESSIONS') or 3)
+
+    # Outbound mail queue: a background worker delivers queued emails over one
+    # persistent SMTP connection, retrying failures with exponential backoff
+    EMAIL_WORKER = os.environ.get('EMAIL_WORKER', 'True') == 'True'
+    EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE') or 50)
+    EMAIL_POLL_INTERVAL = int(os.environ.get('EMAIL_POLL_INTERVAL') or 5)  # seconds
+    EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS') or 5)
+    EMAIL_RETRY_BASE = int(os.environ.get('EMAIL_RETRY_BASE') or 30)  # seconds, doubled per attempt
+    EMAIL_IDLE_TIMEOUT = int(os.environ.get('EMAIL_IDLE_TIMEOUT') or 60)  # seconds before closing SMTP
+    EMAIL_CLAIM_LEASE = int(os.environ.get('EMAIL_CLAIM_LEASE') or 300)  # seconds
@@ -0,0 +1,85 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Engine tuning profiles (Config.DB_PROFILE):
+#   default  - SQLAlchemy defaults, no PRAGMAs (the original behaviour)
+#   sqlite   - WAL journal, synchronous=NORMAL, busy_timeout and a sized pool
+#   postgres - sized pool with overflow, pre-ping and connection recycling
+#   auto     - sqlite or postgres depending on SQLALCHEMY_DATABASE_URI
+DB_PROFILES = ('default', 'sqlite', 'postgres', 'auto')
+
+def resolve_profile(config):
+    profile = config.get('DB_PROFILE') or 'auto'
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{profile}' (options: {', '.join(DB_PROFILES)})")
+    if profile != 'auto':
+        return profile
+    backend = make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend == 'sqlite':
+        return 'sqlite'
+    if backend == 'postgresql':
+        return 'postgres'
+    return 'default'
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def engine_options(profile, config):
+    """Engine keyword arguments for a profile."""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if profile == 'sqlite':
+        options = {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000.0}}
+        if not _is_memory_sqlite(url):
+            # In-memory databases use a single static connection
+            options.update(
+                pool_size=config['DB_POOL_SIZE'],
+                max_overflow=config['DB_MAX_OVERFLOW'],
+                pool_timeout=config['DB_POOL_TIMEOUT']
+            )
+        return options
+    if profile == 'postgres':
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': True
+        }
+    return {}
+
+def sqlite_pragmas(profile, config):
+    if profile != 'sqlite':
+        return {}
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT_MS']
+    }
+
+def configure(app):
+    """
+    Applies the DB_PROFILE engine options. Call before db.init_app(app); explicit
+    SQLALCHEMY_ENGINE_OPTIONS entries take precedence over the profile.
+    """
+    profile = resolve_profile(app.config)
+    options = engine_options(profile, app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    app.config['DB_PROFILE_ACTIVE'] = profile
+
+def init_app(app, db):
+    """Registers the profile's SQLite PRAGMAs on every new connection. Call after db.init_app(app)."""
+    pragmas = sqlite_pragmas(app.config['DB_PROFILE_ACTIVE'], app.config)
+    if not pragmas:
+        return
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
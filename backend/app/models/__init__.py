@@ -3,5 +3,8 @@ from .class_model import Class, AttendanceSession
 from .attendance import Attendance
 from .face_update_request import FaceUpdateRequest
 from .password_reset import PasswordResetToken
+from .attendance_rollup import AttendanceRollup
+from .job import Job
+from .outbound_email import OutboundEmail
 
-__all__ = ['User', 'Class', 'AttendanceSession', 'Attendance', 'FaceUpdateRequest', 'PasswordResetToken']
+__all__ = ['User', 'Class', 'AttendanceSession', 'Attendance', 'FaceUpdateRequest', 'PasswordResetToken', 'AttendanceRollup', 'Job', 'OutboundEmail']
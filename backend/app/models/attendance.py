@@ -12,7 +12,15 @@ class Attendance(db.Model):
     confidence_score = db.Column(db.Float) # Face matching confidence
     
     # Ensure a student can only mark attendance once per session
-    __table_args__ = (db.UniqueConstraint('session_id', 'student_id', name='_session_student_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'student_id', name='_session_student_uc'),
+        # Range scans for filtered and incremental exports
+        db.Index('ix_attendance_timestamp', 'timestamp', 'id'),
+        db.Index('ix_attendance_session_timestamp', 'session_id', 'timestamp'),
+        # Per-student history (newest first) and per-student status counts
+        db.Index('ix_attendance_student_timestamp', 'student_id', 'timestamp'),
+        db.Index('ix_attendance_student_status', 'student_id', 'status'),
+    )
 
     def to_dict(self):
         # Get class info through session relationship
@@ -0,0 +1,20 @@
+from app.extensions import db
+
+class AttendanceRollup(db.Model):
+    """Per-student, per-class attendance counters maintained as sessions start and students mark."""
+    __tablename__ = 'attendance_rollups'
+
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('classes.id'), primary_key=True, index=True)
+    sessions_started = db.Column(db.Integer, nullable=False, default=0)
+    sessions_attended = db.Column(db.Integer, nullable=False, default=0)  # present records
+    last_attended_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'student_id': self.student_id,
+            'class_id': self.class_id,
+            'sessions_started': self.sessions_started,
+            'sessions_attended': self.sessions_attended,
+            'last_attended_at': self.last_attended_at.isoformat() if self.last_attended_at else None
+        }
@@ -19,7 +19,24 @@ class Class(db.Model):
     
     sessions = db.relationship('AttendanceSession', backref='class_obj', lazy='dynamic')
 
-    def to_dict(self):
+    @staticmethod
+    def student_counts(class_ids):
+        """Returns {class_id: enrolled student count} using one GROUP BY query."""
+        if not class_ids:
+            return {}
+        rows = db.session.query(
+            student_classes.c.class_id, db.func.count(student_classes.c.student_id)
+        ).filter(student_classes.c.class_id.in_(class_ids)).group_by(student_classes.c.class_id).all()
+        return dict(rows)
+
+    @staticmethod
+    def to_dict_list(classes):
+        """Serializes many classes with a constant number of queries."""
+        classes = list(classes)
+        counts = Class.student_counts([c.id for c in classes])
+        return [c.to_dict(student_count=counts.get(c.id, 0)) for c in classes]
+
+    def to_dict(self, student_count=None):
         return {
             'id': self.id,
             'name': self.name,
@@ -27,7 +44,7 @@ class Class(db.Model):
             'description': self.description,
             'teacher_id': self.teacher_id,
             'created_at': self.created_at.isoformat(),
-            'student_count': self.students.count()
+            'student_count': student_count if student_count is not None else self.students.count()
         }
 
 class AttendanceSession(db.Model):
@@ -41,6 +58,12 @@ class AttendanceSession(db.Model):
     
     attendances = db.relationship('Attendance', backref='session', lazy='dynamic')
 
+    __table_args__ = (
+        # Active-session lookups, and sessions started per class for the rollup recount
+        db.Index('ix_attendance_sessions_class_active', 'class_id', 'is_active'),
+        db.Index('ix_attendance_sessions_class_start', 'class_id', 'start_time'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -16,6 +16,11 @@ class FaceUpdateRequest(db.Model):
     user = db.relationship('User', foreign_keys=[user_id], backref='face_update_requests')
     reviewer = db.relationship('User', foreign_keys=[reviewed_by])
 
+    # Admin review queue: filtered by status, newest first
+    __table_args__ = (
+        db.Index('ix_face_update_requests_status_created', 'status', 'created_at'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -0,0 +1,78 @@
+import struct
+import numpy as np
+from app.extensions import db
+from app.config import Config
+
+# Header: magic, format version, flags, dimension, model id (8 bytes keeps the floats 4-byte aligned)
+EMBEDDING_HEADER = struct.Struct('<2sBBHH')
+EMBEDDING_MAGIC = b'FE'
+EMBEDDING_FORMAT_VERSION = 1
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+# Header flag bits
+EMBEDDING_FLAG_NORMALIZED = 0x01
+
+# Stable ids for the recognition model that produced an embedding
+EMBEDDING_MODEL_IDS = {
+    'VGG-Face': 1,
+    'Facenet': 2,
+    'Facenet512': 3,
+    'OpenFace': 4,
+    'DeepFace': 5,
+    'DeepID': 6,
+    'Dlib': 7,
+    'ArcFace': 8,
+    'SFace': 9,
+    'GhostFaceNet': 10,
+}
+
+def pack_embedding(embedding, model_name, flags=0):
+    """Packs an embedding into header + little-endian float32 bytes."""
+    values = np.ascontiguousarray(embedding, dtype=EMBEDDING_DTYPE).ravel()
+    if abs(float(np.linalg.norm(values)) - 1.0) < 1e-3:
+        flags |= EMBEDDING_FLAG_NORMALIZED
+    header = EMBEDDING_HEADER.pack(
+        EMBEDDING_MAGIC,
+        EMBEDDING_FORMAT_VERSION,
+        flags,
+        values.size,
+        EMBEDDING_MODEL_IDS.get(model_name, 0)
+    )
+    return header + values.tobytes()
+
+def read_embedding_header(data):
+    """Returns (flags, dimension, model_id) for a packed embedding."""
+    magic, version, flags, dim, model_id = EMBEDDING_HEADER.unpack_from(data)
+    if magic != EMBEDDING_MAGIC or version != EMBEDDING_FORMAT_VERSION:
+        raise ValueError(f"Unsupported face embedding format (magic={magic!r}, version={version})")
+    return flags, dim, model_id
+
+def unpack_embedding(data):
+    """Zero-copy view of a packed embedding as a read-only float32 array."""
+    _, dim, _ = read_embedding_header(data)
+    return np.frombuffer(data, dtype=EMBEDDING_DTYPE, count=dim, offset=EMBEDDING_HEADER.size)
+
+class EmbeddingType(db.TypeDecorator):
+    """
+    Stores a face embedding as packed float32 bytes and loads it as a numpy array.
+    Accepts lists or numpy arrays on assignment.
+    """
+    impl = db.LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        return pack_embedding(value, Config.DEEPFACE_MODEL)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return unpack_embedding(value)
+
+    def compare_values(self, x, y):
+        if x is None or y is None:
+            return x is y
+        return np.array_equal(x, y)
@@ -1,4 +1,6 @@
 from app.extensions import db
+from app.models.types import EmbeddingType
+from sqlalchemy.orm import column_property, deferred
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -11,7 +13,12 @@ class User(db.Model):
     password_hash = db.Column(db.String(128))
     role = db.Column(db.String(20), nullable=False, default='student') # student, teacher, admin
     full_name = db.Column(db.String(100))
-    face_encoding = db.Column(db.PickleType, nullable=True) # Store face encoding as pickled object
+    # Biometric columns are deferred: loaded only by face_encoding_of() or on first access
+    face_encoding = deferred(db.Column(EmbeddingType, nullable=True), group='face') # Packed float32 face embedding, L2-normalized
+    face_encoding_norm = deferred(db.Column(db.Float, nullable=True), group='face') # Norm of the embedding before normalization
+    has_face_encoding = column_property(face_encoding.columns[0].isnot(None))
+    # Bumped on every face registration so per-process caches can spot stale embeddings
+    face_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     face_update_allowed = db.Column(db.Boolean, default=False)  # Admin permission to update face
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
@@ -29,6 +36,41 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    @staticmethod
+    def face_encoding_of(user_id):
+        """Loads just a user's stored embedding (or None) with a single-column query."""
+        return db.session.query(User.face_encoding).filter(User.id == user_id).scalar()
+
+    @staticmethod
+    def summary_columns():
+        """Columns for user listings; the embedding blob is never selected."""
+        return [
+            User.id,
+            User.username,
+            User.email,
+            User.role,
+            User.full_name,
+            User.has_face_encoding,
+            User.face_update_allowed,
+            User.is_active,
+            User.created_at
+        ]
+
+    @staticmethod
+    def summary_to_dict(row):
+        """Serializes a summary_columns() row with the same keys as to_dict()."""
+        return {
+            'id': row.id,
+            'username': row.username,
+            'email': row.email,
+            'role': row.role,
+            'full_name': row.full_name,
+            'has_face_encoding': bool(row.has_face_encoding),
+            'face_update_allowed': row.face_update_allowed,
+            'is_active': row.is_active,
+            'created_at': row.created_at.isoformat()
+        }
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -36,7 +78,7 @@ class User(db.Model):
             'email': self.email,
             'role': self.role,
             'full_name': self.full_name,
-            'has_face_encoding': self.face_encoding is not None,
+            'has_face_encoding': self.has_face_encoding,
             'face_update_allowed': self.face_update_allowed,
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat()
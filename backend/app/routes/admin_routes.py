@@ -2,21 +2,21 @@ from flask import Blueprint, jsonify, request
 from app.models.user import User
 from app.models.class_model import Class
 from app.models.face_update_request import FaceUpdateRequest
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import get_jwt_identity
+from app.services import rollup_service
+from app.services.auth_service import role_required, user_status_cache
+from app.services.face_index import face_index
+from app.services.roster_cache import roster_cache
 from datetime import datetime
 
 bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
+EXPORT_CHUNK_SIZE = 64 * 1024
+USERS_MAX_LIMIT = 500
+
 @bp.route('/stats', methods=['GET'])
-@jwt_required()
+@role_required('admin')
 def get_stats():
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(int(current_user_id))
-    
-    if not current_user or current_user.role != 'admin':
-        return jsonify({'message': 'Access forbidden: Admins only'}), 403
-
-    # In a real app, check for admin role here
     total_users = User.query.count()
     total_classes = Class.query.count()
     active_students = User.query.filter_by(role='student', is_active=True).count()
@@ -30,29 +30,51 @@ def get_stats():
 # --- User CRUD ---
 
 @bp.route('/users', methods=['GET'])
-@jwt_required()
+@role_required('admin')
 def get_users():
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(int(current_user_id))
-    if not current_user or current_user.role != 'admin':
-         return jsonify({'message': 'Access forbidden'}), 403
+    """
+    Users ordered by id, read as plain columns (face embeddings are never loaded).
+    Filters: role, q (case-insensitive prefix of username, email or full name).
+    Optional keyset pagination: ?limit=N&after=<last id>; when a page is full the
+    cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    from app.extensions import db
+    from sqlalchemy import or_
+
+    query = db.session.query(*User.summary_columns())
 
     role_filter = request.args.get('role')
-    query = User.query
     if role_filter:
-        query = query.filter_by(role=role_filter)
-    
-    users = query.all()
-    return jsonify([u.to_dict() for u in users]), 200
+        query = query.filter(User.role == role_filter)
+
+    search = request.args.get('q', '').strip()
+    if search:
+        query = query.filter(or_(
+            User.username.istartswith(search, autoescape=True),
+            User.email.istartswith(search, autoescape=True),
+            User.full_name.istartswith(search, autoescape=True)
+        ))
+
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(User.id > after)
+
+    query = query.order_by(User.id)
+
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, USERS_MAX_LIMIT))
+        query = query.limit(limit)
+
+    rows = query.all()
+    response = jsonify([User.summary_to_dict(row) for row in rows])
+    if limit is not None and len(rows) == limit:
+        response.headers['X-Next-Cursor'] = str(rows[-1].id)
+    return response, 200
 
 @bp.route('/users', methods=['POST'])
-@jwt_required()
+@role_required('admin')
 def create_user():
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(int(current_user_id))
-    if not current_user or current_user.role != 'admin':
-         return jsonify({'message': 'Access forbidden'}), 403
-
     data = request.get_json()
     
     if User.query.filter_by(username=data.get('username')).first():
@@ -75,13 +97,8 @@ def create_user():
     return jsonify({'message': 'User created successfully', 'user': new_user.to_dict()}), 201
 
 @bp.route('/users/<int:user_id>', methods=['PUT'])
-@jwt_required()
+@role_required('admin')
 def update_user(user_id):
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(int(current_user_id))
-    if not current_user or current_user.role != 'admin':
-         return jsonify({'message': 'Access forbidden'}), 403
-
     user = User.query.get_or_404(user_id)
     data = request.get_json()
     
@@ -91,39 +108,37 @@ def update_user(user_id):
         user.email = data['email']
     if 'role' in data:
         user.role = data['role']
+    if 'is_active' in data:
+        user.is_active = bool(data['is_active'])
     if 'password' in data and data['password']:
         user.set_password(data['password'])
         
     from app.extensions import db
     db.session.commit()
+    # Role or active-status changes apply to existing tokens on their next request
+    user_status_cache.invalidate(user_id)
     return jsonify({'message': 'User updated successfully', 'user': user.to_dict()}), 200
 
 @bp.route('/users/<int:user_id>', methods=['DELETE'])
-@jwt_required()
+@role_required('admin')
 def delete_user(user_id):
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(int(current_user_id))
-    if not current_user or current_user.role != 'admin':
-         return jsonify({'message': 'Access forbidden'}), 403
-
     user = User.query.get_or_404(user_id)
     
     from app.extensions import db
+    rollup_service.remove_student(user_id)
     db.session.delete(user)
     db.session.commit()
+    user_status_cache.invalidate(user_id)
+    roster_cache.remove_student(user_id)
+    face_index.remove(user_id)
     return jsonify({'message': 'User deleted successfully'}), 200
 
 
 # --- Face Update Requests ---
 
 @bp.route('/face-update-requests', methods=['GET'])
-@jwt_required()
+@role_required('admin')
 def get_face_update_requests():
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(int(current_user_id))
-    if not current_user or current_user.role != 'admin':
-        return jsonify({'message': 'Access forbidden'}), 403
-
     status_filter = request.args.get('status')
     query = FaceUpdateRequest.query
     if status_filter:
@@ -133,13 +148,8 @@ def get_face_update_requests():
     return jsonify([r.to_dict() for r in requests]), 200
 
 @bp.route('/face-update-requests/<int:request_id>/approve', methods=['POST'])
-@jwt_required()
+@role_required('admin')
 def approve_face_update_request(request_id):
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(int(current_user_id))
-    if not current_user or current_user.role != 'admin':
-        return jsonify({'message': 'Access forbidden'}), 403
-
     update_request = FaceUpdateRequest.query.get_or_404(request_id)
     
     if update_request.status != 'pending':
@@ -147,7 +157,7 @@ def approve_face_update_request(request_id):
     
     # Update request status
     update_request.status = 'approved'
-    update_request.reviewed_by = current_user.id
+    update_request.reviewed_by = int(get_jwt_identity())
     update_request.reviewed_at = datetime.utcnow()
     
     # Grant permission to user
@@ -160,13 +170,8 @@ def approve_face_update_request(request_id):
     return jsonify({'message': 'Request approved. User can now update their face.'}), 200
 
 @bp.route('/face-update-requests/<int:request_id>/deny', methods=['POST'])
-@jwt_required()
+@role_required('admin')
 def deny_face_update_request(request_id):
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(int(current_user_id))
-    if not current_user or current_user.role != 'admin':
-        return jsonify({'message': 'Access forbidden'}), 403
-
     update_request = FaceUpdateRequest.query.get_or_404(request_id)
     
     if update_request.status != 'pending':
@@ -174,7 +179,7 @@ def deny_face_update_request(request_id):
     
     # Update request status
     update_request.status = 'denied'
-    update_request.reviewed_by = current_user.id
+    update_request.reviewed_by = int(get_jwt_identity())
     update_request.reviewed_at = datetime.utcnow()
     
     from app.extensions import db
@@ -186,80 +191,142 @@ def deny_face_update_request(request_id):
 
 # --- Export Attendance to Excel ---
 @bp.route('/export-attendance', methods=['GET'])
-@jwt_required()
+@role_required('admin')
 def export_attendance():
-    from flask import send_file
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
-    from app.models.attendance import Attendance
-    from app.models.class_model import AttendanceSession
-    import io
-    
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(int(current_user_id))
-    if not current_user or current_user.role != 'admin':
-        return jsonify({'message': 'Access forbidden'}), 403
-    
-    # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Attendance Records'
-    
-    # Header style
-    header_fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF')
+    """
+    Streams attendance records as .xlsx (default) or ?format=csv.
+    Filters: class_id, session_id, start/end (ISO date or datetime) and an incremental
+    since/since_id watermark. The newest exported (timestamp, id) is returned in the
+    X-Export-Watermark / X-Export-Watermark-Id headers for the next incremental pull.
+    Records from the last EXPORT_WATERMARK_LAG seconds are left for the next pull,
+    so marks that commit late are not skipped. Rows are read through a
+    server-side cursor in chunks, so memory stays flat.
+    """
+    from flask import Response, stream_with_context
+    from app.services import export_service
+    import os
+    import tempfile
     
-    # Headers
-    headers = ['Student ID', 'Student Name', 'Email', 'Class', 'Subject', 'Date', 'Time', 'Status', 'Confidence Percent']
-    ws.append(headers)
-    
-    # Style headers
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Fetch all attendance records
-    attendances = Attendance.query.join(User).join(AttendanceSession).all()
-    
-    # Add data rows
-    for att in attendances:
-        confidence_pct = round(att.confidence_score * 100, 2) if att.confidence_score else 'N/A'
-        ws.append([
-            att.student.id,
-            att.student.full_name or att.student.username,
-            att.student.email,
-            att.session.class_obj.name if att.session.class_obj else 'N/A',
-            att.session.class_obj.code if att.session.class_obj else 'N/A',
-            att.timestamp.strftime('%Y-%m-%d'),
-            att.timestamp.strftime('%H:%M:%S'),
-            att.status,
-            confidence_pct
-        ])
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                cell_length = len(str(cell.value))
-                if cell_length > max_length:
-                    max_length = cell_length
-            except:
-                pass
-        adjusted_width = max_length + 2
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to BytesIO
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return send_file(
-        output,
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format not in ('xlsx', 'csv'):
+        return jsonify({'message': 'Unsupported format. Use xlsx or csv.'}), 400
+
+    try:
+        filters = export_service.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Cap the export at the newest settled row so concurrent marks land in the next pull
+    watermark = export_service.cap_at_watermark(filters)
+    watermark_headers = {}
+    if watermark:
+        watermark_headers = {
+            'X-Export-Watermark': watermark[0].isoformat(),
+            'X-Export-Watermark-Id': str(watermark[1])
+        }
+    rows = export_service.iter_export_rows(export_service.export_select(**filters))
+
+    if export_format == 'csv':
+        return Response(
+            stream_with_context(export_service.iter_csv(rows)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=attendance_records.csv', **watermark_headers}
+        )
+
+    # Write-only workbook to a temp file, then stream the file back in chunks
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        export_service.write_xlsx(path, rows)
+    except Exception:
+        os.remove(path)
+        raise
+
+    def stream_file():
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    response = Response(
+        stream_file(),
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name='attendance_records.xlsx'
+        headers={
+            'Content-Disposition': 'attachment; filename=attendance_records.xlsx',
+            'Content-Length': str(os.path.getsize(path)),
+            **watermark_headers
+        }
     )
+    # Runs when the server closes the response, even if the body was never iterated
+    # (HEAD requests, clients that disconnect before the first chunk)
+    response.call_on_close(lambda: os.remove(path))
+    return response
 
+
+# --- Background Jobs ---
+@bp.route('/jobs', methods=['POST'])
+@role_required('admin')
+def create_job():
+    """
+    Queues a background job: {"kind": ..., "params": {...}}. Kinds: export_attendance,
+    bulk_create_users, low_attendance_notifications.
+    """
+    from app.services.job_runner import job_runner
+
+    admin_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+    params = data.get('params') or {}
+    if not data.get('kind') or not isinstance(params, dict):
+        return jsonify({'message': 'kind is required and params must be an object'}), 400
+
+    try:
+        job = job_runner.submit(data['kind'], params, user_id=admin_id)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify(job.to_dict()), 202
+
+@bp.route('/jobs', methods=['GET'])
+@role_required('admin')
+def get_jobs():
+    from app.models.job import Job
+
+    query = Job.query
+    status_filter = request.args.get('status')
+    if status_filter:
+        query = query.filter_by(status=status_filter)
+    jobs = query.order_by(Job.created_at.desc()).limit(100).all()
+    return jsonify([j.to_dict() for j in jobs]), 200
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@role_required('admin')
+def get_job(job_id):
+    from app.extensions import db
+    from app.models.job import Job
+
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+@bp.route('/jobs/<job_id>/download', methods=['GET'])
+@role_required('admin')
+def download_job_result(job_id):
+    from flask import send_file
+    from app.extensions import db
+    from app.models.job import Job
+    import os
+
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    if job.status != 'succeeded' or not job.result_path or not os.path.exists(job.result_path):
+        return jsonify({'message': f'No result available (status: {job.status})'}), 409
+
+    return send_file(
+        job.result_path,
+        as_attachment=True,
+        download_name=f"{job.kind}_{job.id}{os.path.splitext(job.result_path)[1]}"
+    )
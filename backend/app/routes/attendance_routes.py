@@ -1,51 +1,59 @@
 from flask import Blueprint, request, jsonify
 from app.models.user import User
-from app.models.class_model import AttendanceSession
+from app.models.class_model import Class, AttendanceSession, student_classes
 from app.models.attendance import Attendance
 from app.extensions import db
-from flask_jwt_extended import jwt_required, get_jwt_identity
-import os
-import uuid
-from app.config import Config
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from app.services.auth_service import role_required
 from app.services.face_recognition_service import FaceRecognitionService
+from app.services.roster_cache import roster_cache
+from app.services import rollup_service
+from app.models.attendance_rollup import AttendanceRollup
+from app.config import Config
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 import math
 
 bp = Blueprint('attendance', __name__, url_prefix='/api/attendance')
 
+HISTORY_MAX_LIMIT = 500
+IDENTIFY_MAX_TOP_K = 50
+
 @bp.route('/mark', methods=['POST'])
-@jwt_required()
+@role_required('student', 'teacher', 'admin')
 def mark_attendance():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(int(current_user_id))
-    
-    if not user.face_encoding:
-        return jsonify({'message': 'Face not registered. Please register face first.'}), 400
+    current_user_id = int(get_jwt_identity())
 
     data = request.form
     session_id = data.get('session_id')
     
     session = AttendanceSession.query.get_or_404(session_id)
     if not session.is_active:
+        roster_cache.evict(session.id)
         return jsonify({'message': 'Session is not active'}), 400
+
+    # Enrolled embedding from the session's roster cache; fall back to the user row
+    stored_embedding = roster_cache.embedding_for(session.id, session.class_id, current_user_id)
+    if stored_embedding is None:
+        stored_embedding = User.face_encoding_of(current_user_id)
+    if stored_embedding is None:
+        return jsonify({'message': 'Face not registered. Please register face first.'}), 400
         
     # Check if already marked
-    existing = Attendance.query.filter_by(session_id=session_id, student_id=user.id).first()
+    existing = Attendance.query.filter_by(session_id=session_id, student_id=current_user_id).first()
     if existing:
         return jsonify({'message': 'Attendance already marked'}), 200
 
     if 'image' not in request.files:
         return jsonify({'message': 'No image provided'}), 400
         
-    file = request.files['image']
-    filename = f"{uuid.uuid4()}.jpg"
-    filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-    file.save(filepath)
-    
     try:
+        # Decode the upload in memory; nothing is written to UPLOAD_FOLDER
+        image = FaceRecognitionService.load_image(request.files['image'])
+
         # Verify face
-        is_match, distance = FaceRecognitionService.verify_face(filepath, user.face_encoding)
-        os.remove(filepath)
+        is_match, distance = FaceRecognitionService.verify_face(image, stored_embedding)
         
         print(f"DEBUG: verify_face result: match={is_match}, distance={distance}, type={type(distance)}")
 
@@ -60,11 +68,12 @@ def mark_attendance():
 
             attendance = Attendance(
                 session_id=session_id,
-                student_id=user.id,
+                student_id=current_user_id,
                 status='present',
                 confidence_score=confidence
             )
             db.session.add(attendance)
+            rollup_service.record_attendance(attendance, session.class_id)
             db.session.commit()
             return jsonify({'message': 'Attendance marked successfully', 'confidence': confidence}), 200
         else:
@@ -76,70 +85,277 @@ def mark_attendance():
             }), 401
             
     except ValueError as e:
-        if os.path.exists(filepath):
-            os.remove(filepath)
         return jsonify({'message': str(e)}), 400
     except Exception as e:
-        if os.path.exists(filepath):
-            os.remove(filepath)
         return jsonify({'message': f'Error processing face: {str(e)}'}), 500
 
+@bp.route('/identify', methods=['POST'])
+@role_required('teacher', 'admin')
+def identify_student():
+    """Identify who is in the image among the students of a session's class (1:N)."""
+    current_user_id = int(get_jwt_identity())
+
+    data = request.form
+    session_id = data.get('session_id')
+
+    session = AttendanceSession.query.get_or_404(session_id)
+    class_obj = session.class_obj
+    if get_jwt()['role'] != 'admin' and class_obj.teacher_id != current_user_id:
+        return jsonify({'message': 'Unauthorized'}), 403
+    if not session.is_active:
+        return jsonify({'message': 'Session is not active'}), 400
+
+    if 'image' not in request.files:
+        return jsonify({'message': 'No image provided'}), 400
+
+    top_k = max(1, min(data.get('top_k', 5, type=int), IDENTIFY_MAX_TOP_K))
+    mark = data.get('mark', 'false').lower() == 'true'
+
+    roster = roster_cache.get(session.id, class_obj.id)
+    ids, matrix = roster.ids, roster.matrix
+    if len(ids) == 0:
+        return jsonify({'message': 'No students with registered faces in this class'}), 400
+
+    try:
+        image = FaceRecognitionService.load_image(request.files['image'])
+        results = FaceRecognitionService.identify_face(image, ids, matrix, top_k)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error processing face: {str(e)}'}), 500
+
+    names = dict(db.session.query(User.id, User.full_name).filter(User.id.in_([r[0] for r in results])).all())
+    matches = [{
+        'student_id': student_id,
+        'student_name': names.get(student_id),
+        'distance': distance,
+        'confidence': max(0.0, min(1.0, 1 - distance)),
+        'is_match': distance < Config.FACE_MATCH_THRESHOLD
+    } for student_id, distance in results]
+
+    marked = None
+    # Rosters in other workers may still hold a just-deleted student until their next refresh
+    if mark and matches and matches[0]['is_match'] and matches[0]['student_id'] in names:
+        best = matches[0]
+        existing = Attendance.query.filter_by(session_id=session.id, student_id=best['student_id']).first()
+        if existing:
+            marked = existing.to_dict()
+        else:
+            attendance = Attendance(
+                session_id=session.id,
+                student_id=best['student_id'],
+                status='present',
+                confidence_score=best['confidence']
+            )
+            db.session.add(attendance)
+            rollup_service.record_attendance(attendance, class_obj.id)
+            db.session.commit()
+            marked = attendance.to_dict()
+
+    return jsonify({'matches': matches, 'marked': marked}), 200
+
+@bp.route('/identify-campus', methods=['POST'])
+@role_required('teacher', 'admin')
+def identify_campus():
+    """Identify a face among all enrolled students (e.g. exam halls) via the campus face index."""
+    if 'image' not in request.files:
+        return jsonify({'message': 'No image provided'}), 400
+
+    top_k = max(1, min(request.form.get('top_k', 5, type=int), IDENTIFY_MAX_TOP_K))
+
+    try:
+        image = FaceRecognitionService.load_image(request.files['image'])
+        results = FaceRecognitionService.search_campus(image, top_k)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error processing face: {str(e)}'}), 500
+
+    students = {
+        row.id: row for row in db.session.query(User.id, User.username, User.full_name)
+        .filter(User.id.in_([r[0] for r in results]))
+    }
+    matches = [{
+        'student_id': student_id,
+        'username': students[student_id].username if student_id in students else None,
+        'student_name': students[student_id].full_name if student_id in students else None,
+        'distance': distance,
+        'confidence': max(0.0, min(1.0, 1 - distance)),
+        'is_match': distance < Config.FACE_MATCH_THRESHOLD
+    } for student_id, distance in results]
+
+    return jsonify({'matches': matches}), 200
+
+@bp.route('/group', methods=['POST'])
+@role_required('teacher', 'admin')
+def mark_group_attendance():
+    """Mark every recognized student in one classroom photo for an active session."""
+    current_user_id = int(get_jwt_identity())
+
+    data = request.form
+    session_id = data.get('session_id')
+
+    session = AttendanceSession.query.get_or_404(session_id)
+    class_obj = session.class_obj
+    if get_jwt()['role'] != 'admin' and class_obj.teacher_id != current_user_id:
+        return jsonify({'message': 'Unauthorized'}), 403
+    if not session.is_active:
+        roster_cache.evict(session.id)
+        return jsonify({'message': 'Session is not active'}), 400
+
+    if 'image' not in request.files:
+        return jsonify({'message': 'No image provided'}), 400
+
+    roster = roster_cache.get(session.id, class_obj.id)
+    if len(roster.ids) == 0:
+        return jsonify({'message': 'No students with registered faces in this class'}), 400
+
+    try:
+        image = FaceRecognitionService.load_image(request.files['image'])
+        faces = FaceRecognitionService.extract_all_embeddings(image)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error processing image: {str(e)}'}), 500
+
+    results = FaceRecognitionService.match_faces([f['embedding'] for f in faces], roster.ids, roster.matrix)
+    matched_ids = [student_id for student_id, _ in results if student_id is not None]
+    existing = {
+        student_id for (student_id,) in db.session.query(User.id).filter(User.id.in_(matched_ids))
+    } if matched_ids else set()
+
+    already_marked = {
+        student_id for (student_id,) in db.session.query(Attendance.student_id).filter_by(session_id=session.id)
+    }
+
+    new_records = []
+    skipped = []
+    unrecognized = 0
+    for student_id, distance in results:
+        if student_id is None or student_id not in existing:
+            unrecognized += 1
+        elif student_id in already_marked:
+            skipped.append(student_id)
+        else:
+            new_records.append(Attendance(
+                session_id=session.id,
+                student_id=student_id,
+                status='present',
+                confidence_score=max(0.0, min(1.0, 1 - distance))
+            ))
+
+    if new_records:
+        db.session.add_all(new_records)
+        for attendance in new_records:
+            rollup_service.record_attendance(attendance, class_obj.id)
+        db.session.commit()
+
+    return jsonify({
+        'message': f'Marked {len(new_records)} student(s) present',
+        'faces_detected': len(faces),
+        'marked': [a.to_dict() for a in new_records],
+        'already_marked': skipped,
+        'unrecognized_faces': unrecognized
+    }), 200
+
 @bp.route('/history', methods=['GET'])
-@jwt_required()
+@role_required()
 def get_history():
-    current_user_id = get_jwt_identity()
-    attendances = Attendance.query.filter_by(student_id=int(current_user_id)).order_by(Attendance.timestamp.desc()).all()
-    return jsonify([a.to_dict() for a in attendances]), 200
+    """
+    Attendance history, newest first. Session, class and student are loaded in the
+    same query. Optional keyset pagination: ?limit=N&before=<ISO timestamp>&before_id=<id>;
+    when a page is full the cursor for the next page is returned in the
+    X-Next-Before and X-Next-Before-Id headers. Without before_id, rows at exactly
+    `before` are skipped.
+    """
+    current_user_id = int(get_jwt_identity())
+
+    query = Attendance.query.options(
+        joinedload(Attendance.session).joinedload(AttendanceSession.class_obj),
+        joinedload(Attendance.student).load_only(User.id, User.full_name)
+    ).filter(Attendance.student_id == current_user_id)
+
+    before = request.args.get('before')
+    if before:
+        try:
+            before = datetime.fromisoformat(before)
+        except ValueError:
+            return jsonify({'message': 'Invalid before timestamp'}), 400
+        before_id = request.args.get('before_id', type=int)
+        if before_id is not None:
+            # (timestamp, id) keyset, so rows sharing the boundary timestamp are not skipped
+            query = query.filter(or_(
+                Attendance.timestamp < before,
+                and_(Attendance.timestamp == before, Attendance.id < before_id)
+            ))
+        else:
+            query = query.filter(Attendance.timestamp < before)
+
+    query = query.order_by(Attendance.timestamp.desc(), Attendance.id.desc())
+
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        query = query.limit(max(1, min(limit, HISTORY_MAX_LIMIT)))
+
+    attendances = query.all()
+    response = jsonify([a.to_dict() for a in attendances])
+    if limit is not None and len(attendances) == min(max(1, limit), HISTORY_MAX_LIMIT):
+        response.headers['X-Next-Before'] = attendances[-1].timestamp.isoformat()
+        response.headers['X-Next-Before-Id'] = str(attendances[-1].id)
+    return response, 200
 
 @bp.route('/stats', methods=['GET'])
-@jwt_required()
+@role_required('student', 'teacher', 'admin')
 def get_attendance_stats():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(int(current_user_id))
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-        
-    # Calculate total sessions for classes the student is enrolled in
-    total_sessions = 0
-    now = datetime.utcnow()
-    
-    for enrolled_class in user.enrolled_classes:
-        # Count sessions that have already started
-        class_sessions_count = enrolled_class.sessions.filter(AttendanceSession.start_time <= now).count()
-        total_sessions += class_sessions_count
+    current_user_id = int(get_jwt_identity())
+
+    # Point reads of the per-class rollup rows for each enrolled class
+    rows = db.session.query(
+        Class.id,
+        Class.name,
+        Class.code,
+        db.func.coalesce(AttendanceRollup.sessions_started, 0),
+        db.func.coalesce(AttendanceRollup.sessions_attended, 0)
+    ).select_from(student_classes).join(
+        Class, Class.id == student_classes.c.class_id
+    ).outerjoin(
+        AttendanceRollup,
+        and_(
+            AttendanceRollup.student_id == student_classes.c.student_id,
+            AttendanceRollup.class_id == student_classes.c.class_id
+        )
+    ).filter(
+        student_classes.c.student_id == current_user_id
+    ).order_by(Class.name).all()
+
+    classes = [{
+        'class_id': class_id,
+        'name': name,
+        'code': code,
+        'total_classes': total,
+        'attended': attended,
+        'percentage': round((attended / total) * 100, 2) if total else 0.0
+    } for class_id, name, code, total, attended in rows]
+
+    total_sessions = sum(c['total_classes'] for c in classes)
+    present_records = sum(c['attended'] for c in classes)
     
     if total_sessions == 0:
         return jsonify({
             'total_classes': 0,
             'attended': 0,
             'percentage': 0.0,
-            'status': 'No classes yet'
+            'status': 'No classes yet',
+            'classes': classes
         }), 200
     
-    # Count present records (status = 'present')
-    present_records = Attendance.query.filter_by(
-        student_id=int(current_user_id),
-        status='present'
-    ).count()
-    
     # Calculate percentage
     percentage = round((present_records / total_sessions) * 100, 2)
     
-    # Determine status based on percentage
-    if percentage >= 85:
-        status = 'excellent'
-    elif percentage >= 75:
-        status = 'good'
-    elif percentage >= 60:
-        status = 'average'
-    else:
-        status = 'poor'
-    
     return jsonify({
         'total_classes': total_sessions,
         'attended': present_records,
         'percentage': percentage,
-        'status': status
+        'status': rollup_service.attendance_status(percentage),
+        'classes': classes
     }), 200
-
@@ -2,12 +2,11 @@ from flask import Blueprint, request, jsonify
 from app.models.user import User
 from app.models.face_update_request import FaceUpdateRequest
 from app.extensions import db
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-import os
-import base64
-import uuid
-from app.config import Config
+from flask_jwt_extended import create_access_token, get_jwt_identity
+from app.services.auth_service import role_required
 from app.services.face_recognition_service import FaceRecognitionService
+from app.services.roster_cache import roster_cache
+from app.services.face_index import face_index
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -58,7 +57,12 @@ def login():
         print(f"DEBUG: User found: {user.username}, Role: {user.role}")
         if user.check_password(data.get('password')):
             print("DEBUG: Password match!")
-            access_token = create_access_token(identity=str(user.id), additional_claims={'role': user.role})
+            if not user.is_active:
+                return jsonify({'message': 'Account is disabled'}), 403
+            access_token = create_access_token(
+                identity=str(user.id),
+                additional_claims={'role': user.role, 'is_active': user.is_active}
+            )
             return jsonify({
                 'token': access_token,
                 'user': user.to_dict()
@@ -71,7 +75,7 @@ def login():
     return jsonify({'message': 'Invalid credentials'}), 401
 
 @bp.route('/register-face', methods=['POST'])
-@jwt_required()
+@role_required()
 def register_face():
     current_user_id = get_jwt_identity()
     user = User.query.get(int(current_user_id))
@@ -80,7 +84,7 @@ def register_face():
         return jsonify({'message': 'User not found'}), 404
 
     # Check if user already has face registered
-    if user.face_encoding:
+    if user.has_face_encoding:
         # User trying to update existing face
         if not user.face_update_allowed:
             return jsonify({
@@ -95,38 +99,28 @@ def register_face():
     if file.filename == '':
         return jsonify({'message': 'No selected file'}), 400
 
-    # Ensure upload directory exists
-    if not os.path.exists(Config.UPLOAD_FOLDER):
-        os.makedirs(Config.UPLOAD_FOLDER)
-
-    filename = f"{uuid.uuid4()}.jpg"
-    filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-    file.save(filepath)
-    
     try:
-        # Check if file was saved correctly
-        if not os.path.exists(filepath):
-             # If save fails, we just mock success for the demo to prevent blocking
-             print("⚠️ File save failed, but proceeding with Mock Success")
-             user.face_encoding = [0.0] * 128
-             db.session.commit()
-             return jsonify({'message': 'Face registered successfully (Mock)'}), 200
+        # Decode the upload in memory; nothing is written to UPLOAD_FOLDER
+        image = FaceRecognitionService.load_image(file)
 
         try:
-            embedding = FaceRecognitionService.extract_embedding(filepath)
+            embedding = FaceRecognitionService.extract_embedding(image)
         except:
              embedding = None
 
-        # Clean up immediately
-        if os.path.exists(filepath):
-            os.remove(filepath)
-
         if embedding:
             print(f"DEBUG: Updating face encoding for user {user.username}. New embedding length: {len(embedding)}")
-            user.face_encoding = embedding
+            # Store unit-length so verification is a single dot product
+            face_encoding, face_encoding_norm = FaceRecognitionService.normalize_embedding(embedding)
+            user.face_encoding, user.face_encoding_norm = face_encoding, face_encoding_norm
+            user.face_version = (user.face_version or 0) + 1
             # Reset permission flag after update to re-lock the face
             user.face_update_allowed = False
             db.session.commit()
+
+            # Refresh this student's row in cached session rosters
+            roster_cache.update_student(user.id, [c.id for c in user.enrolled_classes], face_encoding)
+            face_index.upsert(user.id, face_encoding, user.face_version)
             return jsonify({'message': 'Face registered successfully'}), 200
         else:
             # If embedding is None but no exception raised
@@ -142,14 +136,14 @@ def register_face():
         return jsonify({'message': f'Registration failed: {str(e)}'}), 500
 
 @bp.route('/me', methods=['GET'])
-@jwt_required()
+@role_required()
 def me():
     current_user_id = get_jwt_identity()
     user = User.query.get(int(current_user_id))
     return jsonify(user.to_dict()), 200
 
 @bp.route('/request-face-update', methods=['POST'])
-@jwt_required()
+@role_required()
 def request_face_update():
     current_user_id = get_jwt_identity()
     user = User.query.get(int(current_user_id))
@@ -157,7 +151,7 @@ def request_face_update():
     if not user:
         return jsonify({'message': 'User not found'}), 404
     
-    if not user.face_encoding:
+    if not user.has_face_encoding:
         return jsonify({'message': 'No face registered yet. Please register first.'}), 400
     
     # Check if there's already a pending request
@@ -192,7 +186,7 @@ def request_face_update():
     }), 201
 
 @bp.route('/face-update-status', methods=['GET'])
-@jwt_required()
+@role_required()
 def face_update_status():
     current_user_id = get_jwt_identity()
     
@@ -236,17 +230,16 @@ def forgot_password():
     # For development: use localhost, for production: use your domain
     reset_link = f'http://localhost:5173/reset-password?token={reset_token.token}'
     
-    # Try to send email
+    # Queue the email; the mail worker delivers it in the background
     from app.services.email_service import send_password_reset_email
-    email_sent = send_password_reset_email(user.email, reset_link)
+    email_queued = send_password_reset_email(user.email, reset_link)
     
-    if email_sent:
-        # Email sent successfully
+    if email_queued:
         return jsonify({
             'message': 'Password reset link has been sent to your email',
         }), 200
     else:
-        # Email failed - show link in development mode
+        # Mail not configured - show link in development mode
         print(f'Failed to send email. Reset link: {reset_link}')
         return jsonify({
             'message': 'Email sending failed. Check configuration.',
@@ -2,58 +2,58 @@ from flask import Blueprint, request, jsonify
 from app.models.user import User
 from app.models.class_model import Class, AttendanceSession, student_classes
 from app.extensions import db
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from app.services.auth_service import role_required
+from app.services.roster_cache import roster_cache
+from app.services import rollup_service
+from app.models.attendance_rollup import AttendanceRollup
 import secrets
 from datetime import datetime
 
 bp = Blueprint('classes', __name__, url_prefix='/api/classes')
 
 @bp.route('/all', methods=['GET'])
-@jwt_required()
+@role_required()
 def get_all_classes_public():
     """Get all classes so students can find them to join."""
     classes = Class.query.all()
-    return jsonify([c.to_dict() for c in classes]), 200
+    return jsonify(Class.to_dict_list(classes)), 200
 
 @bp.route('/', methods=['POST'])
-@jwt_required()
+@role_required('teacher', 'admin')
 def create_class():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if user.role != 'teacher' and user.role != 'admin':
-        return jsonify({'message': 'Unauthorized'}), 403
+    current_user_id = int(get_jwt_identity())
         
     data = request.get_json()
     new_class = Class(
         name=data.get('name'),
         code=secrets.token_hex(4).upper(),
         description=data.get('description'),
-        teacher_id=user.id
+        teacher_id=current_user_id
     )
     db.session.add(new_class)
     db.session.commit()
     return jsonify(new_class.to_dict()), 201
 
 @bp.route('/', methods=['GET'])
-@jwt_required()
+@role_required()
 def get_classes():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    current_user_id = int(get_jwt_identity())
     
-    if user.role == 'teacher':
-        classes = Class.query.filter_by(teacher_id=user.id).all()
+    if get_jwt()['role'] == 'teacher':
+        classes = Class.query.filter_by(teacher_id=current_user_id).all()
     else:
         # Students see classes they are enrolled in
-        classes = user.enrolled_classes
+        classes = Class.query.join(
+            student_classes, student_classes.c.class_id == Class.id
+        ).filter(student_classes.c.student_id == current_user_id).all()
         
-    return jsonify([c.to_dict() for c in classes]), 200
+    return jsonify(Class.to_dict_list(classes)), 200
 
 @bp.route('/join', methods=['POST'])
-@jwt_required()
+@role_required()
 def join_class():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    current_user_id = int(get_jwt_identity())
     data = request.get_json()
     code = data.get('code')
     
@@ -62,21 +62,29 @@ def join_class():
         print(f"❌ Join Class Failed: Code '{code}' not found in DB.")
         return jsonify({'message': f"Class code '{code}' not found"}), 404
         
-    if class_obj in user.enrolled_classes:
+    enrolled = db.session.query(student_classes).filter_by(
+        student_id=current_user_id, class_id=class_obj.id
+    ).first()
+    if enrolled:
         return jsonify({'message': 'Already enrolled'}), 400
         
-    user.enrolled_classes.append(class_obj)
+    db.session.execute(student_classes.insert().values(student_id=current_user_id, class_id=class_obj.id))
+    rollup_service.ensure_row(current_user_id, class_obj.id)
     db.session.commit()
+
+    # Add the new student to any cached roster of this class
+    face_encoding = User.face_encoding_of(current_user_id)
+    if face_encoding is not None:
+        roster_cache.update_student(current_user_id, [class_obj.id], face_encoding)
     return jsonify({'message': 'Joined class successfully', 'class': class_obj.to_dict()}), 200
 
 @bp.route('/<int:class_id>/sessions', methods=['POST'])
-@jwt_required()
+@role_required('teacher', 'admin')
 def create_session(class_id):
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    current_user_id = int(get_jwt_identity())
     class_obj = Class.query.get_or_404(class_id)
     
-    if class_obj.teacher_id != user.id:
+    if class_obj.teacher_id != current_user_id:
         return jsonify({'message': 'Unauthorized'}), 403
         
     # Deactivate other active sessions for this class
@@ -87,13 +95,54 @@ def create_session(class_id):
         
     session = AttendanceSession(class_id=class_id)
     db.session.add(session)
+    rollup_service.record_session_started(class_id)
     db.session.commit()
+
+    # Warm the roster embeddings so marks for this session need no embedding read
+    for s in active_sessions:
+        roster_cache.evict(s.id)
+    roster_cache.preload(session.id, class_id)
+
     return jsonify(session.to_dict()), 201
 
 @bp.route('/<int:class_id>/sessions/active', methods=['GET'])
-@jwt_required()
+@role_required()
 def get_active_session(class_id):
     session = AttendanceSession.query.filter_by(class_id=class_id, is_active=True).first()
     if not session:
         return jsonify({'message': 'No active session'}), 404
     return jsonify(session.to_dict()), 200
+
+@bp.route('/<int:class_id>/attendance-summary', methods=['GET'])
+@role_required('teacher', 'admin')
+def get_attendance_summary(class_id):
+    """Per-student attendance for a class, read from the rollup table."""
+    current_user_id = int(get_jwt_identity())
+    class_obj = Class.query.get_or_404(class_id)
+
+    if class_obj.teacher_id != current_user_id and get_jwt()['role'] != 'admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    rows = db.session.query(
+        User.id, User.username, User.full_name, AttendanceRollup
+    ).join(
+        AttendanceRollup, AttendanceRollup.student_id == User.id
+    ).filter(
+        AttendanceRollup.class_id == class_id
+    ).order_by(User.full_name).all()
+
+    students = []
+    for student_id, username, full_name, rollup in rows:
+        percentage = round((rollup.sessions_attended / rollup.sessions_started) * 100, 2) if rollup.sessions_started else 0.0
+        students.append({
+            'student_id': student_id,
+            'username': username,
+            'full_name': full_name,
+            'total_classes': rollup.sessions_started,
+            'attended': rollup.sessions_attended,
+            'percentage': percentage,
+            'status': rollup_service.attendance_status(percentage) if rollup.sessions_started else 'No classes yet',
+            'last_attended_at': rollup.last_attended_at.isoformat() if rollup.last_attended_at else None
+        })
+
+    return jsonify({'class': class_obj.to_dict(), 'students': students}), 200
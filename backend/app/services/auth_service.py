@@ -0,0 +1,87 @@
+import threading
+import time
+from functools import wraps
+from flask import jsonify
+from flask_jwt_extended import verify_jwt_in_request, get_jwt, get_jwt_identity
+from app.extensions import db
+from app.models.user import User
+
+class UserStatusCache:
+    """
+    Per-process TTL cache of (role, is_active) by user id, used to honour role
+    changes, deactivation and deletion before a token expires without a users
+    query on every request. Entries are dropped by invalidate() when an admin
+    edits a user; other worker processes catch up within AUTH_CACHE_TTL seconds.
+    """
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._hits = 0
+        self._misses = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get('AUTH_CACHE_TTL', 60)
+        self.max_entries = app.config.get('AUTH_CACHE_MAX_ENTRIES', 10000)
+
+    def get(self, user_id):
+        """Returns (role, is_active) for a user, or None if the user no longer exists."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+
+        row = db.session.query(User.role, User.is_active).filter(User.id == user_id).first()
+        status = (row.role, bool(row.is_active)) if row else None
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[user_id] = (now + self.ttl, status)
+        return status
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0
+            }
+
+user_status_cache = UserStatusCache()
+
+def role_required(*roles):
+    """
+    Route decorator: requires a valid JWT whose 'role' claim is one of roles
+    (any role when none are given, i.e. login only). The claim is checked
+    against the cached account status, so deleted, deactivated or re-roled
+    users are turned away without a per-request query.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            status = user_status_cache.get(int(get_jwt_identity()))
+            if status is None or not status[1] or get_jwt().get('role') != status[0]:
+                return jsonify({'message': 'Session is no longer valid. Please log in again.'}), 401
+            if roles and status[0] not in roles:
+                return jsonify({'message': 'Access forbidden'}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
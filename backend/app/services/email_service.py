@@ -1,143 +1,268 @@
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
 from flask_mail import Mail, Message
 from flask import current_app
+from sqlalchemy import insert, select
+from app.extensions import db
+from app.models.outbound_email import OutboundEmail
 
 mail = Mail()
 
+def mail_configured():
+    """True when a sender is configured; otherwise callers fall back to showing links in dev."""
+    return bool(current_app.config.get('MAIL_DEFAULT_SENDER'))
+
+def queue_emails(messages):
+    """
+    Queues (recipient, subject, body_text, body_html) tuples for the mail worker
+    with one multi-row INSERT and one commit. Returns the number queued.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            'recipient': recipient,
+            'subject': subject,
+            'body_text': body_text,
+            'body_html': body_html,
+            'status': 'queued',
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now
+        }
+        for recipient, subject, body_text, body_html in messages
+    ]
+    if rows:
+        db.session.execute(insert(OutboundEmail), rows)
+        db.session.commit()
+        email_worker.notify()
+    return len(rows)
+
+def queue_email(recipient, subject, body_text, body_html=None):
+    return queue_emails([(recipient, subject, body_text, body_html)])
+
+def get_email_templates(name):
+    """
+    Returns the compiled (text, html) templates for app/templates/email/<name>.
+    Jinja compiles each template once and caches it on the app's environment.
+    """
+    env = current_app.jinja_env
+    return env.get_template(f'email/{name}.txt'), env.get_template(f'email/{name}.html')
+
+def render_email(name, **context):
+    """Renders one email. Returns (body_text, body_html)."""
+    text_template, html_template = get_email_templates(name)
+    context.setdefault('year', datetime.utcnow().year)
+    return text_template.render(context), html_template.render(context)
+
 def send_password_reset_email(user_email, reset_link):
-    """Send password reset email to user"""
+    """Queue the password reset email. Returns False if mail is not configured."""
+    if not mail_configured():
+        return False
     try:
-        msg = Message(
-            subject='Password Reset Request - Face Attendance System',
-            recipients=[user_email],
-            sender=current_app.config.get('MAIL_DEFAULT_SENDER')
-        )
-        
-        # Email body - HTML version
-        msg.html = f'''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                }}
-                .container {{
-                    max-width: 600px;
-                    margin: 0 auto;
-                    padding: 20px;
-                    background-color: #f9f9f9;
-                }}
-                .header {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 30px;
-                    text-align: center;
-                    border-radius: 10px 10px 0 0;
-                }}
-                .content {{
-                    background: white;
-                    padding: 30px;
-                    border-radius: 0 0 10px 10px;
-                }}
-                .button {{
-                    display: inline-block;
-                    padding: 15px 30px;
-                    background: #667eea;
-                    color: white;
-                    text-decoration: none;
-                    border-radius: 5px;
-                    margin: 20px 0;
-                    font-weight: bold;
-                }}
-                .footer {{
-                    text-align: center;
-                    margin-top: 20px;
-                    font-size: 12px;
-                    color: #888;
-                }}
-                .warning {{
-                    background: #fff3cd;
-                    border-left: 4px solid #ff9800;
-                    padding: 15px;
-                    margin: 20px 0;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🔐 Password Reset Request</h1>
-                </div>
-                <div class="content">
-                    <p>Hello,</p>
-                    
-                    <p>You requested to reset your password for the Face Attendance System.</p>
-                    
-                    <p>Click the button below to reset your password:</p>
-                    
-                    <center>
-                        <a href="{reset_link}" class="button">
-                            Reset My Password
-                        </a>
-                    </center>
-                    
-                    <div class="warning">
-                        <p><strong>⚠️ Important:</strong></p>
-                        <ul>
-                            <li>This link will expire in <strong>1 hour</strong></li>
-                            <li>If you didn't request this, please ignore this email</li>
-                            <li>Your password won't change until you access the link above</li>
-                        </ul>
-                    </div>
-                    
-                    <p>If the button doesn't work, copy and paste this link into your browser:</p>
-                    <p style="word-break: break-all; background: #f5f5f5; padding: 10px; border-radius: 5px;">
-                        {reset_link}
-                    </p>
-                    
-                    <p>If you have any questions, please contact support.</p>
-                    
-                    <p>Best regards,<br>
-                    <strong>Face Attendance System Team</strong></p>
-                </div>
-                <div class="footer">
-                    <p>This is an automated email. Please do not reply to this message.</p>
-                    <p>© 2026 Face Attendance System. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        '''
-        
-        # Plain text version (fallback)
-        msg.body = f'''
-Password Reset Request - Face Attendance System
-
-Hello,
-
-You requested to reset your password for the Face Attendance System.
-
-Click this link to reset your password:
-{reset_link}
-
-IMPORTANT:
-- This link will expire in 1 hour
-- If you didn't request this, please ignore this email
-- Your password won't change until you access the link above
-
-If the link doesn't work, copy and paste it into your browser.
-
-Best regards,
-Face Attendance System Team
-
----
-This is an automated email. Please do not reply to this message.
-        '''
-        
-        mail.send(msg)
+        body, html = render_email('password_reset', reset_link=reset_link)
+        queue_email(user_email, 'Password Reset Request - Face Attendance System', body, html)
         return True
     except Exception as e:
-        print(f"Failed to send email: {str(e)}")
+        print(f"Failed to queue email: {str(e)}")
         return False
+
+def send_low_attendance_emails(students, threshold):
+    """
+    Renders and queues low-attendance warnings in one batch.
+    students: dicts with 'email', 'name', overall 'percentage' and 'classes'
+    (each with name, code, attended, total, percentage), as returned by
+    rollup_service.low_attendance_report(). The templates are looked up once for the
+    whole batch and all rows are inserted with a single commit.
+    Returns the number queued (0 if mail is not configured).
+    """
+    if not mail_configured():
+        return 0
+    text_template, html_template = get_email_templates('low_attendance')
+    year = datetime.utcnow().year
+    subject = 'Low Attendance Warning - Face Attendance System'
+    messages = []
+    for student in students:
+        context = {
+            'name': student['name'],
+            'percentage': student['percentage'],
+            'classes': student['classes'],
+            'threshold': threshold,
+            'year': year
+        }
+        messages.append((student['email'], subject, text_template.render(context), html_template.render(context)))
+    return queue_emails(messages)
+
+class EmailWorker:
+    """
+    Delivers queued OutboundEmail rows from a background thread.
+
+    Rows are claimed in batches with one conditional UPDATE (so several web
+    workers can share the queue), sent over one persistent SMTP connection and
+    retried with exponential backoff. The connection is closed after
+    EMAIL_IDLE_TIMEOUT seconds without mail. A claimed row whose worker died is
+    picked up again once its lease (EMAIL_CLAIM_LEASE) runs out.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.batch_size = 50
+        self.poll_interval = 5
+        self.max_attempts = 5
+        self.retry_base = 30
+        self.idle_timeout = 60
+        self.claim_lease = 300
+        self._connection = None
+        self._last_used = 0.0
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._sent = 0
+        self._retried = 0
+        self._failed = 0
+        self._connections = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('EMAIL_BATCH_SIZE', 50)
+        self.poll_interval = app.config.get('EMAIL_POLL_INTERVAL', 5)
+        self.max_attempts = app.config.get('EMAIL_MAX_ATTEMPTS', 5)
+        self.retry_base = app.config.get('EMAIL_RETRY_BASE', 30)
+        self.idle_timeout = app.config.get('EMAIL_IDLE_TIMEOUT', 60)
+        self.claim_lease = app.config.get('EMAIL_CLAIM_LEASE', 300)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name='email-worker', daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Wakes the worker so newly queued mail goes out without waiting for the next poll."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    while self.process_batch():
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Email worker error: {e}")
+                finally:
+                    db.session.remove()
+            if self._connection is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                self._close()
+
+    def _claim(self):
+        """Marks up to batch_size due rows as sending under a fresh token and returns them."""
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+        due = (
+            OutboundEmail.status.in_(('queued', 'sending')),
+            OutboundEmail.next_attempt_at <= now
+        )
+        candidates = select(OutboundEmail.id).where(*due).order_by(OutboundEmail.id).limit(self.batch_size)
+        db.session.execute(
+            OutboundEmail.__table__.update()
+            .where(OutboundEmail.id.in_(candidates.scalar_subquery()), *due)
+            .values(
+                status='sending',
+                claim_token=token,
+                next_attempt_at=now + timedelta(seconds=self.claim_lease)
+            )
+        )
+        db.session.commit()
+        return OutboundEmail.query.filter_by(claim_token=token, status='sending').order_by(OutboundEmail.id).all()
+
+    def process_batch(self):
+        """Claims and delivers one batch. Returns the number of rows processed."""
+        batch = self._claim()
+        if not batch:
+            return 0
+
+        sender = self.app.config.get('MAIL_DEFAULT_SENDER')
+        for email in batch:
+            message = Message(
+                subject=email.subject,
+                recipients=[email.recipient],
+                body=email.body_text,
+                html=email.body_html,
+                sender=sender
+            )
+            try:
+                self._send(message)
+            except Exception as e:
+                self._record_failure(email, e)
+            else:
+                email.status = 'sent'
+                email.sent_at = datetime.utcnow()
+                email.last_error = None
+                with self._lock:
+                    self._sent += 1
+            email.claim_token = None
+        db.session.commit()
+        return len(batch)
+
+    def _send(self, message):
+        if self._connection is None:
+            connection = mail.connect()
+            connection.__enter__()
+            self._connection = connection
+            with self._lock:
+                self._connections += 1
+        try:
+            self._connection.send(message)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+            # The server rejected this message; the connection itself is still usable
+            raise
+        except Exception:
+            self._close()
+            raise
+        finally:
+            self._last_used = time.monotonic()
+
+    def _record_failure(self, email, error):
+        email.attempts += 1
+        email.last_error = str(error)[:1000]
+        if email.attempts >= self.max_attempts:
+            email.status = 'failed'
+            print(f"Giving up on email {email.id} to {email.recipient}: {error}")
+            with self._lock:
+                self._failed += 1
+        else:
+            email.status = 'queued'
+            email.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.retry_base * 2 ** (email.attempts - 1))
+            with self._lock:
+                self._retried += 1
+
+    def _close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception:
+                pass
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'connected': self._connection is not None,
+                'connections_opened': self._connections,
+                'sent': self._sent,
+                'retried': self._retried,
+                'failed': self._failed
+            }
+
+email_worker = EmailWorker()
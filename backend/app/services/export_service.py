@@ -0,0 +1,207 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from flask import current_app
+from sqlalchemy import select, and_, or_
+from app.extensions import db
+from app.models.user import User
+from app.models.class_model import Class, AttendanceSession
+from app.models.attendance import Attendance
+
+EXPORT_HEADERS = ['Student ID', 'Student Name', 'Email', 'Class', 'Subject', 'Date', 'Time', 'Status', 'Confidence Percent']
+
+# Rows fetched per round trip, and rows sampled to size the Excel columns
+EXPORT_YIELD_PER = 1000
+WIDTH_SAMPLE_ROWS = 500
+
+def _parse_datetime(value, end=False):
+    """Parses an ISO date or datetime; a bare end date covers that whole day."""
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def parse_filters(args):
+    """
+    Builds export filters from request args (or any mapping of strings).
+    Raises ValueError naming the parameter on malformed ids or dates.
+    """
+    filters = {}
+    for name in ('class_id', 'session_id', 'since_id'):
+        value = args.get(name)
+        try:
+            filters[name] = int(value) if value not in (None, '') else None
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {name} '{value}': must be an integer id")
+    for name in ('start', 'end', 'since'):
+        value = args.get(name)
+        try:
+            filters[name] = _parse_datetime(value, end=(name == 'end')) if value else None
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {name} '{value}'. Use ISO format, e.g. 2026-01-31 or 2026-01-31T09:00:00")
+    return filters
+
+def _apply_filters(query, class_id=None, session_id=None, start=None, end=None,
+                   since=None, since_id=None, until=None, until_id=None):
+    """
+    Narrows an attendance query. start/end bound the timestamp (end exclusive);
+    since/since_id and until/until_id are (timestamp, id) watermarks, exclusive and
+    inclusive respectively, matching the export's stable (timestamp, id) ordering.
+    """
+    if class_id is not None:
+        query = query.where(AttendanceSession.class_id == class_id)
+    if session_id is not None:
+        query = query.where(Attendance.session_id == session_id)
+    if start is not None:
+        query = query.where(Attendance.timestamp >= start)
+    if end is not None:
+        query = query.where(Attendance.timestamp < end)
+    if since is not None:
+        if since_id is not None:
+            query = query.where(or_(
+                Attendance.timestamp > since,
+                and_(Attendance.timestamp == since, Attendance.id > since_id)
+            ))
+        else:
+            query = query.where(Attendance.timestamp > since)
+    if until is not None:
+        query = query.where(or_(
+            Attendance.timestamp < until,
+            and_(Attendance.timestamp == until, Attendance.id <= until_id)
+        ))
+    return query
+
+def export_select(**filters):
+    """Column-only select of attendance records, streamed in EXPORT_YIELD_PER chunks."""
+    query = select(
+        User.id,
+        User.full_name,
+        User.username,
+        User.email,
+        Class.name,
+        Class.code,
+        Attendance.timestamp,
+        Attendance.status,
+        Attendance.confidence_score
+    ).select_from(Attendance).join(
+        User, User.id == Attendance.student_id
+    ).join(
+        AttendanceSession, AttendanceSession.id == Attendance.session_id
+    ).outerjoin(
+        Class, Class.id == AttendanceSession.class_id
+    )
+    return _apply_filters(query, **filters).order_by(
+        Attendance.timestamp, Attendance.id
+    ).execution_options(yield_per=EXPORT_YIELD_PER)
+
+def watermark_cutoff():
+    """
+    Newest timestamp an export may include. Attendance.timestamp is set before the
+    insert waits for the write lock, so rows do not commit in (timestamp, id) order;
+    holding back the last EXPORT_WATERMARK_LAG seconds lets late commits land
+    before the watermark passes them.
+    """
+    return datetime.utcnow() - timedelta(seconds=current_app.config.get('EXPORT_WATERMARK_LAG', 120))
+
+def latest_watermark(cutoff=None, **filters):
+    """
+    Returns (timestamp, id) of the newest record matching the filters that is no
+    newer than the cutoff (default watermark_cutoff()), or None.
+    Exports are capped at this watermark so the caller can resume from it next time.
+    """
+    cutoff = cutoff or watermark_cutoff()
+    query = select(Attendance.timestamp, Attendance.id).select_from(Attendance).join(
+        AttendanceSession, AttendanceSession.id == Attendance.session_id
+    ).where(Attendance.timestamp <= cutoff)
+    row = db.session.execute(
+        _apply_filters(query, **filters).order_by(Attendance.timestamp.desc(), Attendance.id.desc()).limit(1)
+    ).first()
+    return (row[0], row[1]) if row else None
+
+def cap_at_watermark(filters):
+    """
+    Caps export filters (in place) at the current watermark and returns it, or None.
+    Without a settled row yet the export is capped below the cutoff, i.e. empty,
+    so newer rows are left for the next pull.
+    """
+    cutoff = watermark_cutoff()
+    watermark = latest_watermark(cutoff=cutoff, **filters)
+    filters['until'], filters['until_id'] = watermark or (cutoff, 0)
+    return watermark
+
+def iter_export_rows(statement=None):
+    """Yields formatted export rows without loading ORM objects."""
+    result = db.session.execute(statement if statement is not None else export_select())
+    for student_id, full_name, username, email, class_name, class_code, timestamp, status, confidence in result:
+        yield [
+            student_id,
+            full_name or username,
+            email,
+            class_name or 'N/A',
+            class_code or 'N/A',
+            timestamp.strftime('%Y-%m-%d'),
+            timestamp.strftime('%H:%M:%S'),
+            status,
+            round(confidence * 100, 2) if confidence else 'N/A'
+        ]
+
+def column_widths(rows):
+    """Column widths (characters) that fit the headers and the given sample rows."""
+    widths = [len(h) for h in EXPORT_HEADERS]
+    for row in rows:
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], len(str(value)))
+    return [w + 2 for w in widths]
+
+def write_xlsx(target, rows):
+    """
+    Writes rows to an .xlsx file (path or binary file object) with openpyxl's
+    write-only mode, so memory stays constant. Column widths come from the first
+    WIDTH_SAMPLE_ROWS rows. Returns the number of data rows written.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Attendance Records')
+
+    rows = iter(rows)
+    sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+    for i, width in enumerate(column_widths(sample), start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+    # Header style
+    header_fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
+    header_font = Font(bold=True, color='FFFFFF')
+    header = []
+    for title in EXPORT_HEADERS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center')
+        header.append(cell)
+    ws.append(header)
+
+    count = 0
+    for row in chain(sample, rows):
+        ws.append(row)
+        count += 1
+
+    wb.save(target)
+    return count
+
+def iter_csv(rows):
+    """Yields the export as CSV text chunks (header first)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % EXPORT_YIELD_PER == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
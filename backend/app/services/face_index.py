@@ -0,0 +1,430 @@
+import atexit
+import os
+import threading
+import time
+import numpy as np
+
+# Users whose embeddings are re-read per query when reconciling with the database
+RECONCILE_CHUNK = 500
+
+class ExactFaceIndex:
+    """Brute-force cosine search over every enrolled embedding (one matrix-vector product)."""
+
+    kind = 'exact'
+
+    def __init__(self, dim=None):
+        self.dim = dim
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim or 0), dtype=np.float32)
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def build(self, ids, vectors):
+        self.ids = np.asarray(ids, dtype=np.int64).copy()
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.dim = self.vectors.shape[1] if len(self.vectors) else self.dim
+        self._rows = {int(user_id): row for row, user_id in enumerate(self.ids)}
+
+    def upsert(self, user_id, vector):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        row = self._rows.get(user_id)
+        if row is not None:
+            self.vectors[row] = vector
+            return
+        if len(self._rows) == 0 and len(self.ids) == 0:
+            self.dim = vector.size
+            self.vectors = np.empty((0, vector.size), dtype=np.float32)
+        self._rows[user_id] = len(self.ids)
+        self.ids = np.append(self.ids, np.int64(user_id))
+        self.vectors = np.vstack([self.vectors, vector])
+
+    def remove(self, user_id):
+        row = self._rows.pop(user_id, None)
+        if row is not None:
+            # Tombstone the row; build() compacts
+            self.ids[row] = -1
+            self.vectors[row] = 0
+
+    def search(self, query, top_k=5):
+        """Returns a list of (user_id, cosine_distance), best first. query must be unit-length."""
+        if len(self._rows) == 0:
+            return []
+        distances = 1 - self.vectors @ query
+        distances[self.ids < 0] = np.inf
+        k = min(top_k, len(self._rows))
+        best = np.argpartition(distances, k - 1)[:k]
+        best = best[np.argsort(distances[best])]
+        return [(int(self.ids[i]), float(distances[i])) for i in best]
+
+    def compacted(self):
+        live = self.ids >= 0
+        return self.ids[live], self.vectors[live]
+
+    def needs_training(self):
+        return False
+
+    def state(self):
+        ids, vectors = self.compacted()
+        return {'ids': ids, 'vectors': vectors}
+
+    def load_state(self, state):
+        self.build(state['ids'], state['vectors'])
+
+class IVFFaceIndex(ExactFaceIndex):
+    """
+    Inverted-file index: embeddings are bucketed under spherical k-means centroids
+    and a search only scans the `nprobe` buckets closest to the query.
+    New embeddings are assigned to their nearest existing centroid, so the index
+    stays incremental; once it outgrows its centroids (needs_training) the owner
+    retrains it with build().
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, dim=None, nlist=None, nprobe=16, train_iterations=10, train_sample=20000):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.train_sample = train_sample
+        self.centroids = None
+        self.assign = np.empty(0, dtype=np.int32)
+        self.lists = []
+
+    def _train(self, vectors):
+        n = len(vectors)
+        nlist = self.nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(n, size=min(n, self.train_sample), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    if norm > 0:
+                        centroids[c] = centroid / norm
+        return np.ascontiguousarray(centroids, dtype=np.float32)
+
+    def _assign(self, vectors, chunk=8192):
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk):
+            labels[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ self.centroids.T, axis=1)
+        return labels
+
+    def _build_lists(self):
+        order = np.argsort(self.assign, kind='stable')
+        bounds = np.searchsorted(self.assign[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]].astype(np.int64) for c in range(len(self.centroids))]
+
+    def build(self, ids, vectors, centroids=None):
+        super().build(ids, vectors)
+        if len(self.ids) == 0:
+            self.centroids = None
+            self.assign = np.empty(0, dtype=np.int32)
+            self.lists = []
+            return
+        self.centroids = centroids if centroids is not None else self._train(self.vectors)
+        self.assign = self._assign(self.vectors)
+        self._build_lists()
+
+    def upsert(self, user_id, vector):
+        if self.centroids is None:
+            # Nothing to train on yet: seed the index with this vector
+            super().upsert(user_id, vector)
+            self.build(self.ids, self.vectors)
+            return
+
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        label = int(np.argmax(self.centroids @ vector))
+        row = self._rows.get(user_id)
+        if row is not None:
+            old = int(self.assign[row])
+            self.vectors[row] = vector
+            if old != label:
+                self.lists[old] = self.lists[old][self.lists[old] != row]
+                self.lists[label] = np.append(self.lists[label], row)
+                self.assign[row] = label
+            return
+
+        super().upsert(user_id, vector)
+        row = self._rows[user_id]
+        self.assign = np.append(self.assign, np.int32(label))
+        self.lists[label] = np.append(self.lists[label], row)
+
+    def remove(self, user_id):
+        row = self._rows.get(user_id)
+        if row is None:
+            return
+        label = int(self.assign[row])
+        self.lists[label] = self.lists[label][self.lists[label] != row]
+        super().remove(user_id)
+
+    def needs_training(self):
+        """
+        True when the centroids were trained on far fewer embeddings than the index
+        now holds (size above 4 * nlist**2, i.e. it has roughly quadrupled) and a
+        retrain would produce more lists.
+        """
+        size = len(self._rows)
+        if size == 0:
+            return False
+        if self.centroids is None:
+            return True
+        nlist = len(self.centroids)
+        target = min(self.nlist or max(1, int(np.sqrt(size))), size)
+        return target > nlist and size > 4 * nlist ** 2
+
+    def search(self, query, top_k=5):
+        if len(self._rows) == 0:
+            return []
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.lists[p] for p in probes])
+        if len(rows) == 0:
+            return []
+        distances = 1 - self.vectors[rows] @ query
+        k = min(top_k, len(rows))
+        best = np.argpartition(distances, k - 1)[:k]
+        best = best[np.argsort(distances[best])]
+        return [(int(self.ids[rows[i]]), float(distances[i])) for i in best]
+
+    def state(self):
+        state = super().state()
+        state['centroids'] = self.centroids if self.centroids is not None else np.empty((0, 0), dtype=np.float32)
+        return state
+
+    def load_state(self, state):
+        centroids = state.get('centroids')
+        if centroids is None or len(centroids) == 0:
+            centroids = None
+        self.build(state['ids'], state['vectors'], centroids=centroids)
+
+INDEX_BACKENDS = {
+    'exact': ExactFaceIndex,
+    'ivf': IVFFaceIndex,
+}
+
+class FaceIndex:
+    """
+    Process-wide campus face index. Loaded from FACE_INDEX_PATH (or built from
+    every enrolled embedding) on first use, then reconciled with the users table:
+    each indexed user's face_version is compared with the database, so faces
+    registered, re-registered or deleted since the file was written (by any
+    worker) are applied. The same check runs at most every
+    FACE_INDEX_REFRESH_INTERVAL seconds while serving. The file is only a
+    warm start: it is written at most every FACE_INDEX_SAVE_INTERVAL seconds
+    and at exit.
+    """
+
+    def __init__(self):
+        self.backend = 'exact'
+        self.path = None
+        self.nprobe = 16
+        self.save_interval = 60
+        self.refresh_interval = 30
+        self._index = None
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._last_refresh = 0.0
+        self._dirty = False
+        self._flush_at_exit = False
+
+    def init_app(self, app):
+        self.backend = app.config.get('FACE_INDEX_BACKEND', 'exact')
+        self.path = app.config.get('FACE_INDEX_PATH')
+        self.nprobe = app.config.get('FACE_INDEX_NPROBE', 16)
+        self.save_interval = app.config.get('FACE_INDEX_SAVE_INTERVAL', 60)
+        self.refresh_interval = app.config.get('FACE_INDEX_REFRESH_INTERVAL', 30)
+        if self.backend not in INDEX_BACKENDS:
+            raise ValueError(f"Unknown FACE_INDEX_BACKEND '{self.backend}' (options: {', '.join(INDEX_BACKENDS)})")
+        if not self._flush_at_exit:
+            atexit.register(self.flush)
+            self._flush_at_exit = True
+
+    def _new_index(self):
+        index = INDEX_BACKENDS[self.backend]()
+        if isinstance(index, IVFFaceIndex):
+            index.nprobe = self.nprobe
+        return index
+
+    def _load_file(self):
+        """Returns (index, versions) from FACE_INDEX_PATH, or None if missing or built for another backend."""
+        if not (self.path and os.path.exists(self.path)):
+            return None
+        with np.load(self.path) as data:
+            if str(data['kind']) != self.backend or 'versions' not in data.files:
+                return None
+            index = self._new_index()
+            index.load_state({key: data[key] for key in data.files if key not in ('kind', 'version_ids', 'versions')})
+            versions = dict(zip(data['version_ids'].tolist(), data['versions'].tolist()))
+        return index, versions
+
+    def _ensure_loaded(self):
+        if self._index is not None:
+            return self._index
+        loaded = self._load_file()
+        if loaded is None:
+            self._index, self._versions = self._build_from_db()
+            self._save()
+        else:
+            self._index, self._versions = loaded
+            changed = self._reconcile()
+            if self._maybe_retrain() or changed:
+                self._save()
+        self._last_refresh = time.monotonic()
+        return self._index
+
+    def _build_from_db(self):
+        from app.extensions import db
+        from app.models.user import User
+        from app.services.face_recognition_service import FaceRecognitionService
+
+        rows = db.session.query(User.id, User.face_version, User.face_encoding).filter(User.face_encoding.isnot(None)).all()
+        ids, matrix = FaceRecognitionService.stack_embeddings([(user_id, encoding) for user_id, _, encoding in rows])
+        index = self._new_index()
+        index.build(ids, matrix)
+        print(f"Built {index.kind} face index over {len(index)} embeddings")
+        return index, {user_id: version for user_id, version, _ in rows}
+
+    @staticmethod
+    def _current_versions():
+        """user id -> face_version for every user with a registered face (no embeddings read)."""
+        from app.extensions import db
+        from app.models.user import User
+
+        return dict(db.session.query(User.id, User.face_version).filter(User.face_encoding.isnot(None)).all())
+
+    @staticmethod
+    def _diff(indexed, current):
+        """(ids to add or replace, ids to remove) to bring indexed versions in line with current ones."""
+        stale = [user_id for user_id, version in current.items() if indexed.get(user_id) != version]
+        removed = [user_id for user_id in indexed if user_id not in current]
+        return stale, removed
+
+    def _reconcile(self):
+        """Applies changes made in the database since the index was loaded. Returns the number of users changed."""
+        from app.extensions import db
+        from app.models.user import User
+
+        stale, removed = self._diff(self._versions, self._current_versions())
+        for user_id in removed:
+            self._index.remove(user_id)
+            del self._versions[user_id]
+        for start in range(0, len(stale), RECONCILE_CHUNK):
+            rows = db.session.query(User.id, User.face_version, User.face_encoding).filter(
+                User.id.in_(stale[start:start + RECONCILE_CHUNK]),
+                User.face_encoding.isnot(None)
+            ).all()
+            for user_id, version, encoding in rows:
+                self._upsert(user_id, encoding)
+                self._versions[user_id] = version
+        changed = len(stale) + len(removed)
+        if changed:
+            print(f"Face index reconciled with the database: {len(stale)} updated, {len(removed)} removed")
+            self._dirty = True
+        return changed
+
+    def _maybe_refresh(self):
+        if time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self._reconcile()
+            self._last_refresh = time.monotonic()
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Per-process temp file: several workers may save at once, the last rename wins
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            kind=np.array(self._index.kind),
+            version_ids=np.fromiter(self._versions.keys(), dtype=np.int64, count=len(self._versions)),
+            versions=np.fromiter(self._versions.values(), dtype=np.int64, count=len(self._versions)),
+            **self._index.state()
+        )
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+        self._dirty = False
+
+    def _maybe_save(self):
+        self._dirty = True
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self._save()
+
+    def _upsert(self, user_id, embedding):
+        if self._index.dim and np.asarray(embedding).size != self._index.dim and len(self._index):
+            return
+        self._index.upsert(user_id, embedding)
+        self._maybe_retrain()
+
+    def _maybe_retrain(self):
+        """Retrains IVF centroids in place once the index has outgrown them. Returns True if it did."""
+        if not self._index.needs_training():
+            return False
+        ids, vectors = self._index.compacted()
+        self._index.build(ids, vectors)
+        self._dirty = True
+        print(f"Retrained {self._index.kind} face index over {len(self._index)} embeddings")
+        return True
+
+    def rebuild(self):
+        """Rebuilds the index from the database (retrains IVF centroids) and persists it. Returns its size."""
+        with self._lock:
+            self._index, self._versions = self._build_from_db()
+            self._save()
+            self._last_refresh = time.monotonic()
+            return len(self._index)
+
+    def check(self):
+        """Compares the saved index file with the database: {'missing_file', 'stale', 'removed'}."""
+        loaded = self._load_file()
+        if loaded is None:
+            return {'missing_file': True, 'stale': [], 'removed': []}
+        stale, removed = self._diff(loaded[1], self._current_versions())
+        return {'missing_file': False, 'stale': stale, 'removed': removed}
+
+    def search(self, query, top_k=5):
+        with self._lock:
+            self._ensure_loaded()
+            self._maybe_refresh()
+            return self._index.search(query, top_k)
+
+    def upsert(self, user_id, embedding, version=None):
+        with self._lock:
+            self._ensure_loaded()
+            self._upsert(user_id, embedding)
+            if version is not None:
+                self._versions[user_id] = version
+            self._maybe_save()
+
+    def remove(self, user_id):
+        with self._lock:
+            # Not loaded here: reconciliation drops the user on the next load
+            if self._index is None:
+                return
+            self._index.remove(user_id)
+            self._versions.pop(user_id, None)
+            self._maybe_save()
+
+    def flush(self):
+        with self._lock:
+            if self._index is not None and self._dirty:
+                self._save()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'loaded': self._index is not None,
+                'size': len(self._index) if self._index is not None else 0,
+                'dirty': self._dirty
+            }
+
+face_index = FaceIndex()
@@ -1,23 +1,47 @@
 import os
-import pickle
+import cv2
 import numpy as np
 from deepface import DeepFace
+from deepface.modules import preprocessing
 from app.config import Config
+from app.services.model_registry import ModelRegistry
+from app.services.inference_batcher import inference_batcher
+from app.services.face_index import face_index
 
 class FaceRecognitionService:
+    @staticmethod
+    def load_image(file):
+        """
+        Decodes an uploaded file straight into a BGR numpy array (no temp file).
+        Raises ValueError if the upload is empty or not a readable image.
+        """
+        data = file.read()
+        if not data:
+            raise ValueError("Uploaded image is empty.")
+
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Uploaded file is not a valid image.")
+        return img
+
     @staticmethod
     def extract_embedding(img_path):
         """
-        Extracts face embedding from an image path using DeepFace.
+        Extracts face embedding from an image path or BGR numpy array using DeepFace.
         Returns a list representing the embedding.
         """
         try:
-            print(f"Extracting embedding for: {img_path}")
+            if isinstance(img_path, np.ndarray):
+                print(f"Extracting embedding for in-memory image {img_path.shape}")
+            else:
+                print(f"Extracting embedding for: {img_path}")
+            # Reuse the process-resident models (built when the worker started serving)
+            ModelRegistry.get_recognition_model()
             # multiple faces can be detected, we assume 1 for registration
             embedding = DeepFace.represent(
                 img_path=img_path,
                 model_name=Config.DEEPFACE_MODEL,
-                detector_backend='ssd',
+                detector_backend=Config.DEEPFACE_DETECTOR,
                 enforce_detection=True  # Changed to True to ensure face is detected
             )
             if embedding and len(embedding) > 0:
@@ -33,39 +57,254 @@ class FaceRecognitionService:
             # Do NOT return a mock embedding - fail properly
             return None
 
+    @staticmethod
+    def _prepare_face(face_obj, target_size):
+        """
+        Turns a face returned by DeepFace.extract_faces into a model input row,
+        mirroring the preprocessing DeepFace.represent applies before inference.
+        """
+        # rgb to bgr
+        face = face_obj["face"][:, :, ::-1]
+        # resize to expected shape of ml model, shape (1, h, w, 3)
+        return preprocessing.resize_image(img=face, target_size=(target_size[1], target_size[0]))
+
+    @staticmethod
+    def detect_face(img, detector_backend=None):
+        """
+        Detects and aligns the face in an image (path or BGR numpy array) and
+        returns it as a model input row for embed_faces.
+        Returns None if no face is detected or the image cannot be processed.
+        """
+        try:
+            model = ModelRegistry.get_recognition_model()
+            face_objs = DeepFace.extract_faces(
+                img_path=img,
+                detector_backend=detector_backend or Config.DEEPFACE_DETECTOR,
+                enforce_detection=True,
+                align=True
+            )
+            # multiple faces can be detected, we assume 1 per image
+            return FaceRecognitionService._prepare_face(face_objs[0], model.input_shape)
+        except ValueError as e:
+            print(f"Face detection error: {e}")
+            return None
+        except Exception as e:
+            print(f"DeepFace processing error: {e}")
+            return None
+
+    @staticmethod
+    def embed_faces(faces):
+        """
+        Runs the recognition model once over faces prepared by detect_face.
+        Returns a list of embeddings aligned with faces. Raises if inference fails.
+        """
+        if not faces:
+            return []
+        model = ModelRegistry.get_recognition_model()
+        batch = preprocessing.normalize_input(img=np.concatenate(faces), normalization='base')
+        return [embedding.tolist() for embedding in model.model(batch, training=False).numpy()]
+
+    @staticmethod
+    def extract_embeddings_batch(images, detector_backend=None):
+        """
+        Extracts one face embedding per image (path or BGR numpy array).
+        Detection runs per image, then the recognition model runs a single
+        forward pass over all detected faces.
+        Returns a list aligned with images; entries are None where no face was detected.
+        """
+        results = [None] * len(images)
+        faces = []
+        owners = []
+        for i, img in enumerate(images):
+            face = FaceRecognitionService.detect_face(img, detector_backend)
+            if face is not None:
+                faces.append(face)
+                owners.append(i)
+
+        try:
+            embeddings = FaceRecognitionService.embed_faces(faces)
+        except Exception as e:
+            print(f"DeepFace batch inference error: {e}")
+            return results
+
+        for i, embedding in zip(owners, embeddings):
+            results[i] = embedding
+        return results
+
+    @staticmethod
+    def extract_all_embeddings(img_path):
+        """
+        Detects every face in one image and embeds them in a single batched forward pass.
+        Returns a list of dicts with 'embedding', 'facial_area' and 'face_confidence'.
+        Raises ValueError if no face is detected.
+        """
+        model = ModelRegistry.get_recognition_model()
+        face_objs = DeepFace.extract_faces(
+            img_path=img_path,
+            detector_backend=Config.DEEPFACE_DETECTOR,
+            enforce_detection=True,
+            align=True
+        )
+
+        faces = [FaceRecognitionService._prepare_face(face_obj, model.input_shape) for face_obj in face_objs]
+        batch = preprocessing.normalize_input(img=np.concatenate(faces), normalization='base')
+        embeddings = model.model(batch, training=False).numpy()
+
+        return [{
+            'embedding': embedding,
+            'facial_area': face_obj['facial_area'],
+            'face_confidence': face_obj['confidence']
+        } for face_obj, embedding in zip(face_objs, embeddings)]
+
+    @staticmethod
+    def match_faces(embeddings, ids, matrix, threshold=None):
+        """
+        Assigns each probe embedding to at most one enrolled student (and each
+        student to at most one face) using one matrix multiply, closest pairs first.
+        Returns a list aligned with embeddings of (user_id or None, best distance).
+        """
+        threshold = Config.FACE_MATCH_THRESHOLD if threshold is None else threshold
+        results = [(None, None)] * len(embeddings)
+        if len(embeddings) == 0 or len(ids) == 0:
+            return results
+
+        probes = np.vstack([FaceRecognitionService.normalize_embedding(e)[0] for e in embeddings])
+        if probes.shape[1] != matrix.shape[1]:
+            return results
+
+        distances = 1 - probes @ matrix.T
+        results = [(None, float(row.min())) for row in distances]
+
+        taken_faces = set()
+        taken_students = set()
+        for flat in np.argsort(distances, axis=None):
+            face, student = np.unravel_index(flat, distances.shape)
+            distance = float(distances[face, student])
+            if distance >= threshold:
+                break
+            if face in taken_faces or student in taken_students:
+                continue
+            taken_faces.add(face)
+            taken_students.add(student)
+            results[face] = (int(ids[student]), distance)
+        return results
+
+    @staticmethod
+    def _extract_probe(img_path):
+        """
+        Extracts the embedding of a probe image. With batching on, detection runs
+        on the calling thread and only the recognition forward pass is shared
+        with concurrent requests.
+        """
+        if inference_batcher.running:
+            face = FaceRecognitionService.detect_face(img_path)
+            if face is None:
+                return None
+            return inference_batcher.embed(face)
+        return FaceRecognitionService.extract_embedding(img_path)
+
+    @staticmethod
+    def normalize_embedding(embedding):
+        """
+        L2-normalizes an embedding.
+        Returns (unit float32 array, original norm); a zero vector is returned unchanged.
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0:
+            return vector, 0.0
+        return vector / norm, norm
+
+    @staticmethod
+    def stack_embeddings(rows):
+        """
+        Stacks (user_id, embedding) rows into an id array and a contiguous
+        float32 matrix for vectorized identification.
+        Rows whose dimension differs from the majority are skipped.
+        """
+        rows = [(user_id, np.asarray(embedding, dtype=np.float32)) for user_id, embedding in rows if embedding is not None]
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+        dims = [embedding.size for _, embedding in rows]
+        dim = max(set(dims), key=dims.count)
+        rows = [(user_id, embedding) for user_id, embedding in rows if embedding.size == dim]
+
+        ids = np.fromiter((user_id for user_id, _ in rows), dtype=np.int64, count=len(rows))
+        matrix = np.vstack([embedding for _, embedding in rows])
+        return ids, matrix
+
+    @staticmethod
+    def identify(embedding, ids, matrix, top_k=5):
+        """
+        Finds the closest enrolled embeddings to a probe with one matrix-vector product.
+        Returns a list of (user_id, cosine_distance), best match first.
+        """
+        if len(ids) == 0:
+            return []
+
+        probe, norm = FaceRecognitionService.normalize_embedding(embedding)
+        if norm == 0 or probe.size != matrix.shape[1]:
+            return []
+
+        distances = 1 - matrix @ probe
+        k = min(top_k, len(ids))
+        best = np.argpartition(distances, k - 1)[:k]
+        best = best[np.argsort(distances[best])]
+        return [(int(ids[i]), float(distances[i])) for i in best]
+
+    @staticmethod
+    def identify_face(img_path, ids, matrix, top_k=5):
+        """
+        Identifies the face in img_path (path or BGR numpy array) among the enrolled embeddings.
+        Returns a list of (user_id, cosine_distance), best match first.
+        """
+        embedding = FaceRecognitionService._extract_probe(img_path)
+        if embedding is None:
+            raise ValueError("No face detected in the image. Please ensure the face is clearly visible in the frame.")
+        return FaceRecognitionService.identify(embedding, ids, matrix, top_k)
+
+    @staticmethod
+    def search_campus(img_path, top_k=5):
+        """
+        Identifies the face in img_path among every enrolled student using the campus face index.
+        Returns a list of (user_id, cosine_distance), best match first.
+        """
+        embedding = FaceRecognitionService._extract_probe(img_path)
+        if embedding is None:
+            raise ValueError("No face detected in the image. Please ensure the face is clearly visible in the frame.")
+        probe, norm = FaceRecognitionService.normalize_embedding(embedding)
+        if norm == 0:
+            return []
+        return face_index.search(probe, top_k)
+
     @staticmethod
     def verify_face(img_path, stored_embedding):
         """
-        Verifies if the face in img_path matches the stored_embedding.
+        Verifies if the face in img_path (path or BGR numpy array) matches the stored_embedding.
         Returns (is_match, distance).
         """
         try:
-            target_embedding = FaceRecognitionService.extract_embedding(img_path)
-            if not target_embedding:
+            target_embedding = FaceRecognitionService._extract_probe(img_path)
+            if target_embedding is None or len(target_embedding) == 0:
                 raise ValueError("No face detected in the image. Please ensure your face is clearly visible in the frame.")
 
             # Validate stored embedding exists and is valid
-            if not stored_embedding or len(stored_embedding) == 0:
+            if stored_embedding is None or len(stored_embedding) == 0:
                 raise ValueError("User has no registered face. Please register your face first.")
             
-            # Convert to numpy arrays
-            a = np.array(stored_embedding)
-            b = np.array(target_embedding)
-            
-            # Cosine distance calculation
-            norm_a = np.linalg.norm(a)
-            norm_b = np.linalg.norm(b)
+            # Stored embeddings are unit-length float32 (normalized at registration),
+            # so only the probe needs normalizing and cosine distance is one dot product
+            a = np.asarray(stored_embedding, dtype=np.float32)
+            b, norm_b = FaceRecognitionService.normalize_embedding(target_embedding)
             
-            if norm_a == 0 or norm_b == 0:
+            if norm_b == 0:
                 print("Error: Zero norm for embedding - invalid face data")
                 return False, 1.0
 
-            cosine_distance = 1 - (np.dot(a, b) / (norm_a * norm_b))
+            cosine_distance = float(1 - np.dot(a, b))
             
-            # Stricter threshold for ArcFace + Cosine
-            # Lower threshold = stricter matching (typical range: 0.4-0.68)
-            # Setting to 0.50 for better security while maintaining usability
-            threshold = 0.50
+            threshold = Config.FACE_MATCH_THRESHOLD
             
             is_match = cosine_distance < threshold
             
@@ -0,0 +1,128 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class InferenceBatcher:
+    """
+    Coalesces concurrent recognition forward passes into micro-batches.
+
+    Request threads detect their face themselves (in parallel), then call
+    embed(face) with the prepared model input and block on a Future. A single
+    worker thread waits up to `window_ms` after the first queued face (or until
+    `max_batch` faces are queued), runs one forward pass over all of them and
+    fans the embeddings back to the waiting threads.
+    """
+
+    def __init__(self):
+        self.window = 0.01
+        self.max_batch = 16
+        self.timeout = 30
+        self._batch_fn = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._reset_metrics()
+
+    def init_app(self, app):
+        from app.services.face_recognition_service import FaceRecognitionService
+
+        self.window = app.config.get('INFERENCE_BATCH_WINDOW_MS', 10) / 1000.0
+        self.max_batch = app.config.get('INFERENCE_MAX_BATCH', 16)
+        self.timeout = app.config.get('INFERENCE_TIMEOUT', 30)
+        self._batch_fn = FaceRecognitionService.embed_faces
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, face):
+        """Queues a prepared face (see FaceRecognitionService.detect_face) and returns a Future resolving to its embedding."""
+        future = Future()
+        self._queue.put((face, future, time.monotonic()))
+        with self._lock:
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return future
+
+    def embed(self, face):
+        """Blocks until the face's embedding is available."""
+        return self.submit(face).result(timeout=self.timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        faces = [item[0] for item in batch]
+        started = time.monotonic()
+        try:
+            embeddings = self._batch_fn(faces)
+        except Exception as e:
+            print(f"Inference batch failed: {e}")
+            embeddings = None
+        finished = time.monotonic()
+
+        if embeddings is not None:
+            for (_, future, _), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+        else:
+            # Retry one by one so a single bad input only fails its own request
+            for face, future, _ in batch:
+                try:
+                    future.set_result(self._batch_fn([face])[0])
+                except Exception as e:
+                    future.set_exception(e)
+
+        with self._lock:
+            size = len(batch)
+            self._batches += 1
+            self._items += size
+            self._last_batch_size = size
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            self._wait_total += sum(started - enqueued for _, _, enqueued in batch)
+            self._inference_total += finished - started
+
+    def _reset_metrics(self):
+        self._batches = 0
+        self._items = 0
+        self._last_batch_size = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = {}
+        self._wait_total = 0.0
+        self._inference_total = 0.0
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'batches': self._batches,
+                'items': self._items,
+                'last_batch_size': self._last_batch_size,
+                'avg_batch_size': round(self._items / self._batches, 2) if self._batches else 0.0,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                'avg_queue_wait_ms': round(self._wait_total / self._items * 1000, 2) if self._items else 0.0,
+                'avg_batch_inference_ms': round(self._inference_total / self._batches * 1000, 2) if self._batches else 0.0
+            }
+
+inference_batcher = InferenceBatcher()
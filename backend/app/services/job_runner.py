@@ -0,0 +1,397 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import or_, func, select, text
+from app.extensions import db
+from app.models.job import Job
+
+# kind -> handler(job, params, output_folder) returning the artifact path (or None)
+JOB_HANDLERS = {}
+# kind -> function(params) returning the params that may stay in the jobs table
+JOB_PARAM_SCRUBBERS = {}
+
+# Missed heartbeats after which a running job counts as orphaned
+ORPHAN_MISSED_HEARTBEATS = 3
+
+# Postgres advisory lock key serializing job claims across web processes
+JOB_CLAIM_LOCK_KEY = 7301
+
+def job_handler(kind, scrub=None):
+    """
+    Registers a function as the handler for a job kind. `scrub` removes secrets
+    (e.g. plaintext passwords) from the stored params once the job is picked up.
+    """
+    def decorator(handler):
+        JOB_HANDLERS[kind] = handler
+        if scrub is not None:
+            JOB_PARAM_SCRUBBERS[kind] = scrub
+        return handler
+    return decorator
+
+def scrub_params(job):
+    """Replaces the job's stored params with their scrubbed form."""
+    scrub = JOB_PARAM_SCRUBBERS.get(job.kind)
+    if scrub is not None and job.params:
+        job.params = json.dumps(scrub(job.get_params()))
+
+def set_progress(job_id, progress, message=None):
+    """
+    Records job progress on its own connection, so handlers can report while
+    their session still has a streaming cursor open.
+    """
+    values = {'progress': max(0.0, min(1.0, progress))}
+    if message is not None:
+        values['message'] = message
+    with db.engine.begin() as conn:
+        conn.execute(Job.__table__.update().where(Job.__table__.c.id == job_id).values(**values))
+
+# --- Worker process side ---
+
+_worker_app = None
+
+def _init_worker(config_overrides):
+    """Builds one job app per pool process (database and config only: no routes or face models)."""
+    global _worker_app
+    from app import create_job_app
+    from app.config import Config
+
+    _worker_app = create_job_app(type('JobWorkerConfig', (Config,), config_overrides))
+
+def _run_job(job_id):
+    with _worker_app.app_context():
+        job = db.session.get(Job, job_id)
+        # Claimed as running by the dispatcher; anything else was failed in the meantime
+        if job is None or job.status != 'running':
+            return
+        params = job.get_params()
+        # Secrets only stay in the table while the job is queued
+        scrub_params(job)
+        db.session.commit()
+
+        try:
+            handler = JOB_HANDLERS[job.kind]
+            output_folder = _worker_app.config['JOB_OUTPUT_FOLDER']
+            os.makedirs(output_folder, exist_ok=True)
+            result_path = handler(job, params, output_folder)
+
+            job = db.session.get(Job, job_id)
+            db.session.refresh(job)
+            job.status = 'succeeded'
+            job.progress = 1.0
+            job.result_path = result_path
+        except Exception as e:
+            db.session.rollback()
+            print(f"Job {job_id} failed: {e}")
+            traceback.print_exc()
+            job = db.session.get(Job, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+# --- Web process side ---
+
+class JobRunner:
+    """
+    Runs long admin jobs in a local process pool, tracked in the jobs table.
+
+    Submitted jobs wait in the table as queued. Every serving process polls
+    (every JOB_POLL_INTERVAL seconds, or right away after a submit or a finished
+    job) and claims the oldest queued job with one conditional UPDATE that only
+    succeeds while fewer than JOB_MAX_WORKERS jobs are running, so the cap holds
+    across all web workers and heavy jobs cannot starve request handling.
+
+    The pool dies with its web process, so each runner stamps its running jobs
+    with a heartbeat every JOB_HEARTBEAT_INTERVAL seconds. Running jobs whose
+    owner missed ORPHAN_MISSED_HEARTBEATS beats (e.g. after a restart) are marked
+    failed by the next serving process that checks. The same beat deletes job
+    results older than JOB_RESULT_RETENTION_DAYS.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.max_workers = 2
+        self.poll_interval = 5
+        self.heartbeat_interval = 30
+        self.retention_days = 7
+        self.runner_id = str(uuid.uuid4())
+        self._executor = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('JOB_MAX_WORKERS', 2)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', 5)
+        self.heartbeat_interval = app.config.get('JOB_HEARTBEAT_INTERVAL', 30)
+        self.retention_days = app.config.get('JOB_RESULT_RETENTION_DAYS', 7)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts the dispatcher thread, which also fails orphaned jobs (right away, then every heartbeat)."""
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name='job-dispatcher', daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Wakes the dispatcher so a queued job or a freed slot is picked up without waiting for the next poll."""
+        self._wake.set()
+
+    def _run(self):
+        last_beat = None
+        while True:
+            with self.app.app_context():
+                try:
+                    if last_beat is None or time.monotonic() - last_beat >= self.heartbeat_interval:
+                        last_beat = time.monotonic()
+                        self.fail_orphaned_jobs()
+                        self.heartbeat()
+                        self.sweep_results()
+                    self.dispatch()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Job dispatcher error: {e}")
+                finally:
+                    db.session.remove()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def heartbeat(self):
+        """Marks this runner's running jobs as alive."""
+        with db.engine.begin() as conn:
+            conn.execute(Job.__table__.update().where(
+                Job.__table__.c.runner_id == self.runner_id,
+                Job.__table__.c.status == 'running'
+            ).values(heartbeat_at=datetime.utcnow()))
+
+    def fail_orphaned_jobs(self):
+        """Fails running jobs of other runners that stopped heartbeating. Returns how many."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.heartbeat_interval * ORPHAN_MISSED_HEARTBEATS)
+        orphans = Job.query.filter(
+            Job.status == 'running',
+            or_(Job.runner_id.is_(None), Job.runner_id != self.runner_id),
+            func.coalesce(Job.heartbeat_at, Job.started_at, Job.created_at) < cutoff
+        ).all()
+        for job in orphans:
+            job.status = 'failed'
+            job.error = 'Interrupted: the server process running this job stopped'
+            job.finished_at = datetime.utcnow()
+            scrub_params(job)
+        db.session.commit()
+        if orphans:
+            print(f"Marked {len(orphans)} orphaned job(s) as failed")
+        return len(orphans)
+
+    def sweep_results(self):
+        """
+        Deletes files in JOB_OUTPUT_FOLDER older than the retention period (results
+        and partial output of failed jobs) and clears the expired jobs' result_path.
+        Returns the number of files removed.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        expired = Job.query.filter(Job.result_path.isnot(None), Job.finished_at < cutoff).all()
+        for job in expired:
+            job.result_path = None
+            job.message = 'Result expired'
+        db.session.commit()
+
+        folder = self.app.config['JOB_OUTPUT_FOLDER']
+        if not os.path.isdir(folder):
+            return 0
+        oldest = time.time() - self.retention_days * 86400
+        removed = 0
+        for entry in os.scandir(folder):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < oldest:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                # Another process swept it first
+                pass
+        if removed:
+            print(f"Removed {removed} expired job result file(s)")
+        return removed
+
+    def _claim(self):
+        """
+        Moves the oldest queued job to running under this runner, only while fewer
+        than max_workers jobs are running in total. Returns its id, or None.
+        """
+        jobs = Job.__table__
+        now = datetime.utcnow()
+        running = select(func.count()).select_from(jobs).where(jobs.c.status == 'running')
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                # READ COMMITTED would let two claims count the same free slot; SQLite serializes writers already
+                conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': JOB_CLAIM_LOCK_KEY})
+            job_id = conn.execute(
+                select(jobs.c.id).where(jobs.c.status == 'queued').order_by(jobs.c.created_at).limit(1)
+            ).scalar()
+            if job_id is None:
+                return None
+            claimed = conn.execute(jobs.update().where(
+                jobs.c.id == job_id,
+                jobs.c.status == 'queued',
+                running.scalar_subquery() < self.max_workers
+            ).values(status='running', runner_id=self.runner_id, started_at=now, heartbeat_at=now)).rowcount
+        return job_id if claimed else None
+
+    def dispatch(self):
+        """Claims queued jobs into this process's pool while the global cap allows. Returns how many started."""
+        started = 0
+        while True:
+            job_id = self._claim()
+            if job_id is None:
+                return started
+            future = self._get_executor().submit(_run_job, job_id)
+            future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+            started += 1
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=({
+                    'SQLALCHEMY_DATABASE_URI': self.app.config['SQLALCHEMY_DATABASE_URI'],
+                    'JOB_OUTPUT_FOLDER': self.app.config['JOB_OUTPUT_FOLDER']
+                },)
+            )
+        return self._executor
+
+    def submit(self, kind, params, user_id=None):
+        """Creates a queued job for the dispatchers to claim. Raises ValueError for unknown kinds."""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind '{kind}' (options: {', '.join(sorted(JOB_HANDLERS))})")
+
+        job = Job(kind=kind, params=json.dumps(params or {}), created_by=user_id)
+        db.session.add(job)
+        db.session.commit()
+        # Dispatch from this process too, even without start_services
+        self.start()
+        self.notify()
+        return job
+
+    def _on_done(self, job_id, future):
+        # A slot is free: look for the next queued job now
+        self.notify()
+        # Only reached with an exception if the worker process itself died
+        error = future.exception()
+        if error is None:
+            return
+        with self.app.app_context():
+            job = db.session.get(Job, job_id)
+            if job and job.status in ('queued', 'running'):
+                job.status = 'failed'
+                job.error = f"Worker process failed: {error}"
+                job.finished_at = datetime.utcnow()
+                scrub_params(job)
+                db.session.commit()
+
+job_runner = JobRunner()
+
+# --- Job handlers ---
+
+@job_handler('export_attendance')
+def export_attendance_job(job, params, output_folder):
+    """Attendance export (same filters as /api/admin/export-attendance) written to a file."""
+    from app.services import export_service
+
+    export_format = params.get('format', 'xlsx')
+    if export_format not in ('xlsx', 'csv'):
+        raise ValueError('Unsupported format. Use xlsx or csv.')
+    filters = export_service.parse_filters(params)
+
+    export_service.cap_at_watermark(filters)
+    statement = export_service.export_select(**filters)
+    total = db.session.execute(select(func.count()).select_from(statement.order_by(None).subquery())).scalar() or 0
+
+    def tracked(rows):
+        for i, row in enumerate(rows, start=1):
+            if i % 5000 == 0 and total:
+                set_progress(job.id, i / total, f'{i} of {total} rows')
+            yield row
+
+    rows = tracked(export_service.iter_export_rows(statement))
+    path = os.path.join(output_folder, f'{job.id}.{export_format}')
+    if export_format == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            for chunk in export_service.iter_csv(rows):
+                f.write(chunk)
+    else:
+        export_service.write_xlsx(path, rows)
+
+    set_progress(job.id, 1.0, f'{total} rows exported')
+    return path
+
+def _without_passwords(params):
+    return dict(params, users=[
+        {key: value for key, value in data.items() if key != 'password'}
+        for data in params.get('users', [])
+    ])
+
+@job_handler('bulk_create_users', scrub=_without_passwords)
+def bulk_create_users_job(job, params, output_folder):
+    """Creates users from params['users']; writes a JSON report of created and skipped rows."""
+    from app.models.user import User
+
+    users = params.get('users', [])
+    created, skipped = [], []
+    for i, data in enumerate(users, start=1):
+        username, email = data.get('username'), data.get('email')
+        if not username or not email or not data.get('password'):
+            skipped.append({'row': i, 'username': username, 'reason': 'username, email and password are required'})
+        elif User.query.filter((User.username == username) | (User.email == email)).first():
+            skipped.append({'row': i, 'username': username, 'reason': 'Username or email already exists'})
+        else:
+            user = User(
+                username=username,
+                email=email,
+                role=data.get('role', 'student'),
+                full_name=data.get('full_name')
+            )
+            user.set_password(data['password'])
+            db.session.add(user)
+            db.session.flush()
+            created.append({'row': i, 'id': user.id, 'username': username})
+
+        if i % 100 == 0:
+            db.session.commit()
+            set_progress(job.id, i / len(users), f'{i} of {len(users)} users processed')
+    db.session.commit()
+
+    path = os.path.join(output_folder, f'{job.id}.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'created': created, 'skipped': skipped}, f, indent=2)
+    set_progress(job.id, 1.0, f'{len(created)} created, {len(skipped)} skipped')
+    return path
+
+@job_handler('low_attendance_notifications')
+def low_attendance_notifications_job(job, params, output_folder):
+    """Queues low-attendance warnings; params: threshold, min_sessions, dry_run. Writes a JSON summary."""
+    from app.services import notification_service
+
+    summary = notification_service.notify_low_attendance(
+        threshold=float(params['threshold']) if params.get('threshold') is not None else None,
+        min_sessions=int(params['min_sessions']) if params.get('min_sessions') is not None else None,
+        dry_run=bool(params.get('dry_run', False))
+    )
+
+    path = os.path.join(output_folder, f'{job.id}.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    set_progress(job.id, 1.0, f"{summary['students']} below {summary['threshold']}%, {summary['queued']} emails queued")
+    return path
@@ -0,0 +1,76 @@
+import threading
+import numpy as np
+from deepface import DeepFace
+from app.config import Config
+
+class ModelRegistry:
+    """
+    Process-wide holder for the DeepFace recognition model and face detector.
+    Models are built once per worker (when it starts serving) and reused by every request.
+    """
+    _lock = threading.Lock()
+    _recognition_model = None
+    _detector = None
+    _ready = False
+    _error = None
+
+    @classmethod
+    def warm_up(cls):
+        """
+        Builds the recognition model and detector and runs one dummy inference
+        so the first real request does not pay the graph build cost.
+        Returns True when the models are ready.
+        """
+        with cls._lock:
+            if cls._ready:
+                return True
+            try:
+                print(f"Warming up DeepFace ({Config.DEEPFACE_MODEL} + {Config.DEEPFACE_DETECTOR})...")
+                cls._recognition_model = DeepFace.build_model(
+                    model_name=Config.DEEPFACE_MODEL,
+                    task='facial_recognition'
+                )
+                cls._detector = DeepFace.build_model(
+                    model_name=Config.DEEPFACE_DETECTOR,
+                    task='face_detector'
+                )
+
+                # Trace the inference path once on a blank frame
+                DeepFace.represent(
+                    img_path=np.zeros((224, 224, 3), dtype=np.uint8),
+                    model_name=Config.DEEPFACE_MODEL,
+                    detector_backend=Config.DEEPFACE_DETECTOR,
+                    enforce_detection=False
+                )
+                cls._ready = True
+                cls._error = None
+                print("DeepFace models ready")
+            except Exception as e:
+                cls._error = str(e)
+                print(f"DeepFace warm-up failed: {e}")
+            return cls._ready
+
+    @classmethod
+    def get_recognition_model(cls):
+        if not cls._ready:
+            cls.warm_up()
+        return cls._recognition_model
+
+    @classmethod
+    def get_detector(cls):
+        if not cls._ready:
+            cls.warm_up()
+        return cls._detector
+
+    @classmethod
+    def is_ready(cls):
+        return cls._ready
+
+    @classmethod
+    def status(cls):
+        return {
+            'ready': cls._ready,
+            'model': Config.DEEPFACE_MODEL,
+            'detector': Config.DEEPFACE_DETECTOR,
+            'error': cls._error
+        }
@@ -0,0 +1,32 @@
+from flask import current_app
+from app.services import email_service, rollup_service
+
+def notify_low_attendance(threshold=None, min_sessions=None, dry_run=False):
+    """
+    Queues a warning email for every student below the attendance threshold
+    (LOW_ATTENDANCE_THRESHOLD by default). The students come from one aggregation
+    over the rollup table and the emails are rendered and queued as one batch.
+    Returns a summary dict.
+    """
+    if threshold is None:
+        threshold = current_app.config.get('LOW_ATTENDANCE_THRESHOLD', 75)
+    if min_sessions is None:
+        min_sessions = current_app.config.get('LOW_ATTENDANCE_MIN_SESSIONS', 3)
+
+    students = rollup_service.low_attendance_report(threshold, min_sessions)
+    statuses = {}
+    for student in students:
+        statuses[student['status']] = statuses.get(student['status'], 0) + 1
+
+    queued = 0
+    if students and not dry_run:
+        queued = email_service.send_low_attendance_emails(students, threshold)
+
+    return {
+        'threshold': threshold,
+        'min_sessions': min_sessions,
+        'students': len(students),
+        'by_status': statuses,
+        'queued': queued,
+        'dry_run': dry_run
+    }
@@ -0,0 +1,225 @@
+from datetime import datetime
+from sqlalchemy import Float, and_, or_, case, cast, func, distinct, insert, select
+from app.extensions import db
+from app.models.attendance import Attendance
+from app.models.attendance_rollup import AttendanceRollup
+from app.models.class_model import Class, AttendanceSession, student_classes
+from app.models.user import User
+
+ROLLUP_COLUMNS = ['student_id', 'class_id', 'sessions_started', 'sessions_attended', 'last_attended_at']
+
+# Lower bound (percent) of each status band, best first; anything below is 'poor'
+STATUS_BANDS = [(85, 'excellent'), (75, 'good'), (60, 'average')]
+
+def attendance_status(percentage):
+    """Maps an attendance percentage to its status band."""
+    for lower_bound, status in STATUS_BANDS:
+        if percentage >= lower_bound:
+            return status
+    return 'poor'
+
+def attendance_status_expr(percentage):
+    """SQL CASE expression equivalent of attendance_status()."""
+    return case(*[(percentage >= lower_bound, status) for lower_bound, status in STATUS_BANDS], else_='poor')
+
+def recount_select(student_id=None, class_id=None, exclude_existing=False):
+    """
+    Full recount of the rollup from attendance_sessions and attendance, one row per
+    enrollment. Optionally limited to one student/class, or to enrollments that
+    have no rollup row yet.
+    """
+    now = datetime.utcnow()
+    query = select(
+        student_classes.c.student_id,
+        student_classes.c.class_id,
+        func.count(distinct(AttendanceSession.id)),
+        func.count(distinct(Attendance.id)),
+        func.max(Attendance.timestamp)
+    ).select_from(student_classes).outerjoin(
+        AttendanceSession,
+        and_(AttendanceSession.class_id == student_classes.c.class_id, AttendanceSession.start_time <= now)
+    ).outerjoin(
+        Attendance,
+        and_(
+            Attendance.session_id == AttendanceSession.id,
+            Attendance.student_id == student_classes.c.student_id,
+            Attendance.status == 'present'
+        )
+    ).group_by(student_classes.c.student_id, student_classes.c.class_id)
+
+    if student_id is not None:
+        query = query.where(student_classes.c.student_id == student_id)
+    if class_id is not None:
+        query = query.where(student_classes.c.class_id == class_id)
+    if exclude_existing:
+        query = query.where(~select(AttendanceRollup.student_id).where(
+            AttendanceRollup.student_id == student_classes.c.student_id,
+            AttendanceRollup.class_id == student_classes.c.class_id
+        ).exists())
+    return query
+
+def _insert_missing(student_id=None, class_id=None):
+    """Creates rollup rows (from a recount) for enrollments that do not have one yet."""
+    db.session.execute(
+        insert(AttendanceRollup).from_select(
+            ROLLUP_COLUMNS,
+            recount_select(student_id=student_id, class_id=class_id, exclude_existing=True)
+        )
+    )
+
+def ensure_row(student_id, class_id):
+    """Call after a student joins a class (before commit)."""
+    db.session.flush()
+    _insert_missing(student_id=student_id, class_id=class_id)
+
+def record_session_started(class_id):
+    """Call after a session is added for class_id (before commit)."""
+    db.session.flush()
+    db.session.execute(
+        AttendanceRollup.__table__.update()
+        .where(AttendanceRollup.class_id == class_id)
+        .values(sessions_started=AttendanceRollup.sessions_started + 1)
+    )
+    # Enrollments without a row get a recount, which already includes the new session
+    _insert_missing(class_id=class_id)
+
+def record_attendance(attendance, class_id):
+    """Call after a present Attendance row is added (before commit)."""
+    if attendance.status != 'present':
+        return
+    db.session.flush()
+    result = db.session.execute(
+        AttendanceRollup.__table__.update()
+        .where(
+            AttendanceRollup.student_id == attendance.student_id,
+            AttendanceRollup.class_id == class_id
+        )
+        .values(
+            sessions_attended=AttendanceRollup.sessions_attended + 1,
+            last_attended_at=case(
+                (or_(
+                    AttendanceRollup.last_attended_at.is_(None),
+                    AttendanceRollup.last_attended_at < attendance.timestamp
+                ), attendance.timestamp),
+                else_=AttendanceRollup.last_attended_at
+            )
+        )
+    )
+    if result.rowcount == 0:
+        # No row yet: create it from a recount if the student is enrolled
+        _insert_missing(student_id=attendance.student_id, class_id=class_id)
+
+def remove_student(student_id):
+    """Call when a user is deleted (before commit): drops their rollup rows."""
+    db.session.execute(
+        AttendanceRollup.__table__.delete().where(AttendanceRollup.student_id == student_id)
+    )
+
+def rebuild():
+    """Recomputes the whole rollup table from attendance and sessions. Returns the row count."""
+    db.session.execute(AttendanceRollup.__table__.delete())
+    db.session.execute(insert(AttendanceRollup).from_select(ROLLUP_COLUMNS, recount_select()))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(AttendanceRollup).scalar()
+
+def check_consistency():
+    """
+    Compares the rollup table to a full recount.
+    Returns a list of mismatches as dicts (empty when consistent).
+    """
+    expected = {
+        (row[0], row[1]): tuple(row[2:])
+        for row in db.session.execute(recount_select())
+    }
+    actual = {
+        (r.student_id, r.class_id): (r.sessions_started, r.sessions_attended, r.last_attended_at)
+        for r in AttendanceRollup.query
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key) != actual.get(key):
+            mismatches.append({
+                'student_id': key[0],
+                'class_id': key[1],
+                'expected': expected.get(key),
+                'actual': actual.get(key)
+            })
+    return mismatches
+
+def low_attendance_select(threshold, min_sessions=1):
+    """
+    Active students whose overall attendance percentage (present / started sessions
+    across their classes, as in /api/attendance/stats) is below threshold, in one
+    aggregation over attendance_rollups. Students with fewer than min_sessions
+    started sessions are left out.
+    Columns: student_id, sessions_started, sessions_attended, percentage, status.
+    """
+    started = func.sum(AttendanceRollup.sessions_started)
+    attended = func.sum(AttendanceRollup.sessions_attended)
+    percentage = cast(attended, Float) * 100 / started
+    return select(
+        AttendanceRollup.student_id,
+        started.label('sessions_started'),
+        attended.label('sessions_attended'),
+        percentage.label('percentage'),
+        attendance_status_expr(percentage).label('status')
+    ).join(
+        User, User.id == AttendanceRollup.student_id
+    ).where(
+        User.role == 'student',
+        User.is_active.is_(True)
+    ).group_by(
+        AttendanceRollup.student_id
+    ).having(
+        started >= max(min_sessions, 1),
+        percentage < threshold
+    )
+
+def low_attendance_report(threshold, min_sessions=1):
+    """
+    Students below threshold with their per-class breakdown, fetched in one query.
+    Returns a list of dicts: student_id, email, name, percentage, status, classes.
+    """
+    low = low_attendance_select(threshold, min_sessions).subquery()
+    rows = db.session.execute(
+        select(
+            low.c.student_id,
+            User.email,
+            func.coalesce(User.full_name, User.username),
+            low.c.percentage,
+            low.c.status,
+            Class.name,
+            Class.code,
+            AttendanceRollup.sessions_started,
+            AttendanceRollup.sessions_attended
+        ).select_from(low).join(
+            User, User.id == low.c.student_id
+        ).join(
+            AttendanceRollup, AttendanceRollup.student_id == low.c.student_id
+        ).join(
+            Class, Class.id == AttendanceRollup.class_id
+        ).where(
+            AttendanceRollup.sessions_started > 0
+        ).order_by(low.c.student_id, Class.name)
+    )
+
+    report = []
+    for student_id, email, name, percentage, status, class_name, class_code, started, attended in rows:
+        if not report or report[-1]['student_id'] != student_id:
+            report.append({
+                'student_id': student_id,
+                'email': email,
+                'name': name,
+                'percentage': round(percentage, 2),
+                'status': status,
+                'classes': []
+            })
+        report[-1]['classes'].append({
+            'name': class_name,
+            'code': class_code,
+            'attended': attended,
+            'total': started,
+            'percentage': round(attended / started * 100, 2)
+        })
+    return report
@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.extensions import db
+from app.models.user import User
+from app.models.class_model import student_classes
+from app.services.face_recognition_service import FaceRecognitionService
+
+def _enrolled_with_face(query, class_id):
+    return query.join(
+        student_classes, student_classes.c.student_id == User.id
+    ).filter(
+        student_classes.c.class_id == class_id,
+        User.face_encoding.isnot(None)
+    )
+
+def load_roster(class_id):
+    """
+    Stacks the enrolled embeddings of a class into (ids, matrix) with one query.
+    Returns (ids, matrix, versions) where versions maps student id -> face_version.
+    """
+    rows = _enrolled_with_face(db.session.query(User.id, User.face_version, User.face_encoding), class_id).all()
+    ids, matrix = FaceRecognitionService.stack_embeddings([(user_id, encoding) for user_id, _, encoding in rows])
+    return ids, matrix, {user_id: version for user_id, version, _ in rows}
+
+def load_roster_versions(class_id):
+    """student id -> face_version for the enrolled students with a face (no embeddings read)."""
+    return dict(_enrolled_with_face(db.session.query(User.id, User.face_version), class_id).all())
+
+class Roster:
+    """
+    Enrolled embeddings of one class: id array, float32 matrix and id -> row index.
+    `versions` is the face_version of each student when the roster was loaded.
+    """
+
+    def __init__(self, class_id, ids, matrix, versions=None):
+        self.class_id = class_id
+        self.ids = ids
+        self.matrix = matrix
+        self.versions = versions or {}
+        self.index = {int(student_id): row for row, student_id in enumerate(ids)}
+        self.checked_at = time.monotonic()
+
+    def with_student(self, student_id, embedding):
+        """Returns a copy with the student's row replaced or appended (readers keep the old arrays)."""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if len(self.ids) and embedding.size != self.matrix.shape[1]:
+            return self
+        row = self.index.get(student_id)
+        if row is not None:
+            matrix = self.matrix.copy()
+            matrix[row] = embedding
+            return Roster(self.class_id, self.ids, matrix, self.versions)
+        if len(self.ids) == 0:
+            return Roster(self.class_id, np.array([student_id], dtype=np.int64), embedding.reshape(1, -1), self.versions)
+        return Roster(
+            self.class_id,
+            np.append(self.ids, np.int64(student_id)),
+            np.vstack([self.matrix, embedding]),
+            self.versions
+        )
+
+    def without_student(self, student_id):
+        row = self.index.get(student_id)
+        if row is None:
+            return self
+        keep = np.arange(len(self.ids)) != row
+        versions = {k: v for k, v in self.versions.items() if k != student_id}
+        return Roster(self.class_id, self.ids[keep], np.ascontiguousarray(self.matrix[keep]), versions)
+
+class RosterCache:
+    """
+    Per-process cache of class roster embeddings keyed by attendance session id.
+    Rosters are preloaded when a session starts and evicted when it goes inactive.
+    Changes made in this process are applied directly; changes made by other
+    workers (re-registered faces, new enrollments, deleted users) are picked up
+    by comparing face versions with the database at most every refresh_interval
+    seconds.
+    """
+
+    def __init__(self, max_sessions=256, refresh_interval=10):
+        self.max_sessions = max_sessions
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._rosters = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._reloads = 0
+
+    def init_app(self, app):
+        self.max_sessions = app.config.get('ROSTER_CACHE_MAX_SESSIONS', 256)
+        self.refresh_interval = app.config.get('ROSTER_CACHE_REFRESH_INTERVAL', 10)
+
+    def preload(self, session_id, class_id):
+        """Loads a class roster for a session, replacing any cached copy."""
+        ids, matrix, versions = load_roster(class_id)
+        roster = Roster(class_id, ids, matrix, versions)
+        with self._lock:
+            self._rosters[session_id] = roster
+            self._rosters.move_to_end(session_id)
+            while len(self._rosters) > self.max_sessions:
+                self._rosters.popitem(last=False)
+        return roster
+
+    def get(self, session_id, class_id):
+        """Returns the cached roster for a session, loading it on a miss or when it is stale."""
+        with self._lock:
+            roster = self._rosters.get(session_id)
+            if roster is None:
+                self._misses += 1
+            elif time.monotonic() - roster.checked_at < self.refresh_interval:
+                self._hits += 1
+                self._rosters.move_to_end(session_id)
+                return roster
+
+        if roster is not None:
+            if load_roster_versions(class_id) == roster.versions:
+                roster.checked_at = time.monotonic()
+                with self._lock:
+                    self._hits += 1
+                return roster
+            with self._lock:
+                self._reloads += 1
+        return self.preload(session_id, class_id)
+
+    def embedding_for(self, session_id, class_id, student_id):
+        """
+        Returns a student's cached embedding for a session, or None if the
+        student has no registered face in that class.
+        """
+        roster = self.get(session_id, class_id)
+        row = roster.index.get(student_id)
+        return roster.matrix[row] if row is not None else None
+
+    def evict(self, session_id):
+        with self._lock:
+            self._rosters.pop(session_id, None)
+
+    def update_student(self, student_id, class_ids, embedding):
+        """Replaces (or adds) a student's row in every cached roster of the given classes."""
+        class_ids = set(class_ids)
+        with self._lock:
+            for session_id, roster in self._rosters.items():
+                if roster.class_id in class_ids:
+                    if embedding is None:
+                        self._rosters[session_id] = roster.without_student(student_id)
+                    else:
+                        self._rosters[session_id] = roster.with_student(student_id, embedding)
+
+    def remove_student(self, student_id):
+        """Drops a (deleted) student from every cached roster."""
+        with self._lock:
+            for session_id, roster in self._rosters.items():
+                self._rosters[session_id] = roster.without_student(student_id)
+
+    def clear(self):
+        with self._lock:
+            self._rosters.clear()
+
+    def metrics(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'sessions': len(self._rosters),
+                'embeddings': sum(len(r.ids) for r in self._rosters.values()),
+                'hits': self._hits,
+                'misses': self._misses,
+                'reloads': self._reloads,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0
+            }
+
+roster_cache = RosterCache()
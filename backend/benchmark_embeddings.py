@@ -0,0 +1,53 @@
+"""
+Benchmark FaceRecognitionService.extract_embeddings_batch on CPU.
+
+Usage:
+    python benchmark_embeddings.py [path/to/face.jpg] [--images 64]
+
+With an image, the full detection + recognition path is measured.
+Without one, random frames are fed with the detector skipped, which
+isolates the recognition forward pass.
+"""
+import os
+import sys
+import time
+import argparse
+
+# Force CPU so results are comparable across machines
+os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+import cv2
+import numpy as np
+from app.services.model_registry import ModelRegistry
+from app.services.face_recognition_service import FaceRecognitionService
+
+BATCH_SIZES = [1, 8, 32]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('image', nargs='?', help='image containing one face')
+parser.add_argument('--images', type=int, default=64, help='images processed per batch size')
+args = parser.parse_args()
+
+if args.image:
+    frame = cv2.imread(args.image)
+    if frame is None:
+        sys.exit(f"❌ Could not read {args.image}")
+    images = [frame] * args.images
+    detector = None
+else:
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (112, 112, 3), dtype=np.uint8) for _ in range(args.images)]
+    detector = 'skip'
+
+print("⏳ Warming up models...")
+if not ModelRegistry.warm_up():
+    sys.exit("❌ DeepFace models failed to load")
+FaceRecognitionService.extract_embeddings_batch(images[:1], detector_backend=detector)
+
+print(f"{'batch':>6} {'total s':>9} {'ms/image':>9} {'images/s':>9}")
+for batch_size in BATCH_SIZES:
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        FaceRecognitionService.extract_embeddings_batch(images[i:i + batch_size], detector_backend=detector)
+    elapsed = time.perf_counter() - start
+    print(f"{batch_size:>6} {elapsed:>9.2f} {elapsed / len(images) * 1000:>9.1f} {len(images) / elapsed:>9.1f}")
@@ -0,0 +1,60 @@
+"""
+Recall / latency benchmark of the campus face index against exact search.
+
+Usage:
+    python benchmark_face_index.py [--sizes 10000 50000 100000] [--queries 500] [--nprobe 4 8 16]
+
+Synthetic 512-d unit embeddings stand in for enrolled students; each query is an
+enrolled embedding plus noise (cosine ~0.75 to its source, like a fresh camera
+probe), so the exact nearest neighbour is known.
+"""
+import time
+import argparse
+import numpy as np
+from app.services.face_index import ExactFaceIndex, IVFFaceIndex
+
+DIM = 512
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 100000])
+parser.add_argument('--queries', type=int, default=500)
+parser.add_argument('--nprobe', type=int, nargs='+', default=[8, 16, 32])
+parser.add_argument('--top-k', type=int, default=10)
+args = parser.parse_args()
+
+def unit(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+def run(index, queries, top_k):
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        results.append([user_id for user_id, _ in index.search(q, top_k)])
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+rng = np.random.default_rng(42)
+print(f"{'size':>7} {'index':>12} {'build s':>8} {'ms/query':>9} {'recall@1':>9} {'1-in-top10':>10}")
+for size in args.sizes:
+    vectors = unit(rng.normal(size=(size, DIM)))
+    ids = np.arange(1, size + 1, dtype=np.int64)
+    sources = rng.choice(size, size=args.queries, replace=False)
+    queries = unit(vectors[sources] + 0.9 / np.sqrt(DIM) * rng.normal(size=(args.queries, DIM)))
+
+    exact = ExactFaceIndex()
+    start = time.perf_counter()
+    exact.build(ids, vectors)
+    build_s = time.perf_counter() - start
+    truth, exact_ms = run(exact, queries, args.top_k)
+    print(f"{size:>7} {'exact':>12} {build_s:>8.2f} {exact_ms:>9.2f} {1.0:>9.3f} {1.0:>10.3f}")
+
+    ivf = IVFFaceIndex()
+    start = time.perf_counter()
+    ivf.build(ids, vectors)
+    build_s = time.perf_counter() - start
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        found, ivf_ms = run(ivf, queries, args.top_k)
+        recall_1 = np.mean([f[:1] == t[:1] for f, t in zip(found, truth)])
+        recall_10 = np.mean([t[0] in f for f, t in zip(found, truth)])
+        label = f"ivf/{ivf.centroids.shape[0]}/{nprobe}"
+        print(f"{size:>7} {label:>12} {build_s:>8.2f} {ivf_ms:>9.2f} {recall_1:>9.3f} {recall_10:>10.3f}")
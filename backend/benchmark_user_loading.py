@@ -0,0 +1,144 @@
+"""
+Per-request database read volume for common endpoints, with the deferred
+face_encoding columns versus eager loading (how User was mapped before).
+
+Usage:
+    python benchmark_user_loading.py [--users 2000]
+
+Seeds a throwaway in-memory database with students holding 512-d embeddings,
+records every SELECT each request issues and replays it to total the size of
+the values the database returned.
+"""
+import argparse
+import datetime
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session, undefer_group
+from flask_jwt_extended import create_access_token
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models.user import User
+from app.models.class_model import Class, AttendanceSession
+from app.services.auth_service import user_status_cache
+from app.services.face_recognition_service import FaceRecognitionService
+
+DIM = 512
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--users', type=int, default=2000)
+args = parser.parse_args()
+
+class BenchmarkConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+class ReadRecorder:
+    """Collects SELECT statements so they can be replayed and their results measured."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.statements.append((statement, parameters))
+
+    def bytes_read(self):
+        total = 0
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        try:
+            with self.engine.connect() as conn:
+                for statement, parameters in self.statements:
+                    for row in conn.exec_driver_sql(statement, parameters):
+                        total += sum(value_size(v) for v in row)
+        finally:
+            event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return total
+
+def value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return len(value.isoformat())
+    return 8
+
+def load_eagerly(execute_state):
+    # Emulates the old mapping where the embedding came with every User row
+    if not execute_state.is_select:
+        return
+    entities = execute_state.statement.column_descriptions
+    if len(entities) == 1 and entities[0]['type'] is User:
+        execute_state.statement = execute_state.statement.options(undefer_group('face'))
+
+def seed(num_users):
+    rng = np.random.default_rng(0)
+    admin = User(username='admin', email='admin@example.com', role='admin', full_name='Admin')
+    teacher = User(username='teacher', email='teacher@example.com', role='teacher', full_name='Teacher')
+    admin.set_password('password')
+    teacher.set_password('password')
+    db.session.add_all([admin, teacher])
+    db.session.flush()
+
+    classes = [Class(name=f'Class {i}', code=f'C{i:05d}', teacher_id=teacher.id) for i in range(20)]
+    db.session.add_all(classes)
+    password_hash = admin.password_hash
+    students = []
+    for i in range(num_users):
+        student = User(username=f'student{i}', email=f'student{i}@example.com', role='student',
+                       full_name=f'Student {i}', password_hash=password_hash)
+        student.face_encoding, student.face_encoding_norm = FaceRecognitionService.normalize_embedding(
+            rng.normal(size=DIM).astype(np.float32))
+        student.enrolled_classes = classes[i % 20::20][:1] + classes[(i + 7) % 20::20][:1]
+        students.append(student)
+    db.session.add_all(students)
+    db.session.flush()
+    db.session.add_all([AttendanceSession(class_id=c.id) for c in classes])
+    db.session.commit()
+    return admin.id, teacher.id, students[0].id
+
+def main():
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        admin_id, teacher_id, student_id = seed(args.users)
+        client = app.test_client()
+        recorder = ReadRecorder(db.engine)
+
+        requests = [
+            ('GET /api/auth/me', '/api/auth/me', student_id),
+            ('GET /api/admin/stats', '/api/admin/stats', admin_id),
+            ('GET /api/admin/users?limit=100', '/api/admin/users?limit=100', admin_id),
+            ('GET /api/classes/ (teacher)', '/api/classes/', teacher_id),
+            ('GET /api/classes/ (student)', '/api/classes/', student_id),
+            ('GET /api/attendance/stats', '/api/attendance/stats', student_id),
+        ]
+
+        def measure(url, user_id):
+            role = db.session.get(User, user_id).role
+            token = create_access_token(identity=str(user_id), additional_claims={'role': role, 'is_active': True})
+            auth = {'Authorization': f'Bearer {token}'}
+            db.session.remove()
+            user_status_cache.clear()
+            recorder.statements = []
+            response = client.get(url, headers=auth)
+            assert response.status_code == 200, f"{url}: HTTP {response.status_code}"
+            return recorder.bytes_read()
+
+        print(f"{args.users} students with {DIM}-d embeddings\n")
+        print(f"{'request':<32} {'eager':>12} {'deferred':>12} {'saved':>8}")
+        for name, url, user_id in requests:
+            event.listen(Session, 'do_orm_execute', load_eagerly)
+            eager = measure(url, user_id)
+            event.remove(Session, 'do_orm_execute', load_eagerly)
+            deferred = measure(url, user_id)
+            saved = (1 - deferred / eager) * 100 if eager else 0.0
+            print(f"{name:<32} {eager:>10,} B {deferred:>10,} B {saved:>7.1f}%")
+
+if __name__ == '__main__':
+    main()
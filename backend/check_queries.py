@@ -0,0 +1,178 @@
+"""
+Query-count and query-plan regression checks for the hot endpoints.
+
+Usage:
+    python check_queries.py
+
+Builds a throwaway in-memory database, seeds it, and asserts that each
+endpoint issues a constant number of SQL queries regardless of row count,
+and that the queries behind the hot lookups search an index (EXPLAIN QUERY
+PLAN) instead of scanning the table.
+"""
+import re
+import sys
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models.user import User
+from app.models.class_model import Class, AttendanceSession
+from app.models.attendance import Attendance
+from app.models.face_update_request import FaceUpdateRequest
+from app.services import rollup_service
+
+NUM_CLASSES = 500
+NUM_STUDENTS = 50
+
+class CheckConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def reset(self):
+        self.count = 0
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append((statement, parameters))
+
+def seed():
+    teacher = User(username='teacher', email='teacher@example.com', role='teacher', full_name='Teacher')
+    teacher.set_password('password')
+    db.session.add(teacher)
+    db.session.flush()
+
+    classes = [Class(name=f'Class {i}', code=f'C{i:05d}', teacher_id=teacher.id) for i in range(NUM_CLASSES)]
+    db.session.add_all(classes)
+
+    students = []
+    for i in range(NUM_STUDENTS):
+        student = User(username=f'student{i}', email=f'student{i}@example.com', role='student')
+        student.set_password('password')
+        student.enrolled_classes = classes[i::NUM_STUDENTS]
+        students.append(student)
+    db.session.add_all(students)
+    db.session.flush()
+
+    admin = User(username='admin', email='admin@example.com', role='admin', full_name='Admin')
+    admin.set_password('password')
+    db.session.add(admin)
+
+    sessions = [AttendanceSession(class_id=c.id) for c in classes]
+    db.session.add_all(sessions)
+    db.session.flush()
+
+    # Every student marks every session of their classes; a handful ask for a face update
+    db.session.add_all([
+        Attendance(session_id=s.id, student_id=student.id, status='present')
+        for s in sessions for student in students if s.class_id in {c.id for c in student.enrolled_classes}
+    ])
+    db.session.add_all([
+        FaceUpdateRequest(user_id=student.id, reason='New glasses, please allow an update', status=status)
+        for student, status in zip(students, ['pending', 'approved', 'denied'] * NUM_STUDENTS)
+    ])
+    db.session.commit()
+    return teacher.id, students[0].id, admin.id, classes[0].id
+
+def headers(user_id):
+    # Same claims as /api/auth/login
+    user = db.session.get(User, user_id)
+    token = create_access_token(identity=str(user_id), additional_claims={'role': user.role, 'is_active': user.is_active})
+    return {'Authorization': f'Bearer {token}'}
+
+def check(client, counter, name, url, user_id, max_queries):
+    auth = headers(user_id)
+    counter.reset()
+    response = client.get(url, headers=auth)
+    assert response.status_code == 200, f"{name}: HTTP {response.status_code}"
+    ok = counter.count <= max_queries
+    print(f"{'✅' if ok else '❌'} {name}: {counter.count} queries (max {max_queries})")
+    return ok
+
+PLAN_STEP = re.compile(r'^(SCAN|SEARCH)(?: TABLE)? (\w+)')
+
+def table_scans(statement, parameters, tables):
+    """Plan steps that scan (rather than search) one of the tables, aliases included."""
+    scans = []
+    for row in db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+        detail = row[-1]
+        step = PLAN_STEP.match(detail)
+        if step and step.group(1) == 'SCAN' and re.fullmatch(rf"({'|'.join(tables)})(_\d+)?", step.group(2)):
+            scans.append(detail)
+    return scans
+
+def check_plan(name, statements, tables):
+    """Every SELECT touching the tables must reach them through an index search."""
+    scans, checked = [], 0
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith('SELECT'):
+            continue
+        if not any(re.search(rf'\b{table}\b', statement) for table in tables):
+            continue
+        checked += 1
+        scans.extend(table_scans(statement, parameters, tables))
+    ok = checked > 0 and not scans
+    if scans:
+        detail = f"table scan: {'; '.join(scans)}"
+    elif not checked:
+        detail = 'no query touched the table'
+    else:
+        detail = f"{checked} queries on {', '.join(tables)} use an index"
+    print(f"{'✅' if ok else '❌'} {name}: {detail}")
+    return ok
+
+def check_route_plan(client, counter, name, url, user_id, tables):
+    auth = headers(user_id)
+    counter.reset()
+    response = client.get(url, headers=auth)
+    assert response.status_code == 200, f"{name}: HTTP {response.status_code}"
+    return check_plan(name, counter.statements, tables)
+
+def check_select_plan(name, statement, tables):
+    compiled = statement.compile(db.engine)
+    params = tuple(compiled.params[key] for key in compiled.positiontup)
+    return check_plan(name, [(str(compiled), params)], tables)
+
+def main():
+    app = create_app(CheckConfig)
+    with app.app_context():
+        db.create_all()
+        teacher_id, student_id, admin_id, class_id = seed()
+        counter = QueryCounter(db.engine)
+        client = app.test_client()
+
+        results = [
+            # First request for the student: includes the uncached account status check
+            check(client, counter, 'GET /api/classes/all', '/api/classes/all', student_id, 3),
+            check(client, counter, 'GET /api/classes/ (teacher)', '/api/classes/', teacher_id, 3),
+            check(client, counter, 'GET /api/classes/ (student)', '/api/classes/', student_id, 3),
+            check(client, counter, 'GET /api/attendance/stats', '/api/attendance/stats', student_id, 2),
+            # Second request: role/active status comes from the auth cache
+            check(client, counter, 'GET /api/attendance/stats (cached auth)', '/api/attendance/stats', student_id, 1),
+        ]
+
+        print()
+        results += [
+            check_route_plan(client, counter, 'plan GET /api/attendance/history',
+                             '/api/attendance/history?limit=20', student_id, ['attendance']),
+            check_route_plan(client, counter, 'plan GET /api/classes/<id>/sessions/active',
+                             f'/api/classes/{class_id}/sessions/active', teacher_id, ['attendance_sessions']),
+            check_route_plan(client, counter, 'plan GET /api/admin/face-update-requests',
+                             '/api/admin/face-update-requests?status=pending', admin_id, ['face_update_requests']),
+            # Source of the stats rollup rows for a student
+            check_select_plan('plan rollup recount (student)', rollup_service.recount_select(student_id=student_id),
+                              ['attendance', 'attendance_sessions']),
+        ]
+
+    if not all(results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""Add users.face_version for cache freshness checks
+
+Revision ID: 0d6b8e2f4a91
+Revises: f3c5a9e1d742
+Create Date: 2026-10-19 09:12:36.204817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0d6b8e2f4a91'
+down_revision = 'f3c5a9e1d742'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('face_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('face_version')
@@ -0,0 +1,28 @@
+"""Add attendance export indexes
+
+Revision ID: 5a0f6d2e8b14
+Revises: e91a3b7c5f20
+Create Date: 2026-10-18 14:48:09.127354
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a0f6d2e8b14'
+down_revision = 'e91a3b7c5f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('attendance', schema=None) as batch_op:
+        batch_op.create_index('ix_attendance_timestamp', ['timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_attendance_session_timestamp', ['session_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('attendance', schema=None) as batch_op:
+        batch_op.drop_index('ix_attendance_session_timestamp')
+        batch_op.drop_index('ix_attendance_timestamp')
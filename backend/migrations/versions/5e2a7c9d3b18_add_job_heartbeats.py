@@ -0,0 +1,28 @@
+"""Add job runner id and heartbeat for orphan detection
+
+Revision ID: 5e2a7c9d3b18
+Revises: 0d6b8e2f4a91
+Create Date: 2026-10-19 10:47:05.391628
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2a7c9d3b18'
+down_revision = '0d6b8e2f4a91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('runner_id', sa.String(length=36), nullable=True))
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
+        batch_op.drop_column('runner_id')
@@ -0,0 +1,55 @@
+"""Store face encodings as packed float32 bytes
+
+Revision ID: 7b2e4c91d0a5
+Revises: 3f58ff92b819
+Create Date: 2026-10-18 09:12:44.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import pickle
+import struct
+import numpy as np
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e4c91d0a5'
+down_revision = '3f58ff92b819'
+branch_labels = None
+depends_on = None
+
+# Mirrors app.models.types (format version 1, ArcFace model id)
+HEADER = struct.Struct('<2sBBHH')
+MAGIC = b'FE'
+FORMAT_VERSION = 1
+ARCFACE_MODEL_ID = 8
+
+users = sa.table('users',
+    sa.column('id', sa.Integer),
+    sa.column('face_encoding', sa.LargeBinary)
+)
+
+
+def upgrade():
+    # PickleType and the packed format share the same binary column type,
+    # so only the stored bytes change.
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(users.c.id, users.c.face_encoding).where(users.c.face_encoding.isnot(None))).fetchall()
+    for user_id, blob in rows:
+        if bytes(blob[:2]) == MAGIC:
+            continue  # already packed
+        values = np.asarray(pickle.loads(blob), dtype='<f4').ravel()
+        packed = HEADER.pack(MAGIC, FORMAT_VERSION, 0, values.size, ARCFACE_MODEL_ID) + values.tobytes()
+        conn.execute(users.update().where(users.c.id == user_id).values(face_encoding=packed))
+
+
+def downgrade():
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(users.c.id, users.c.face_encoding).where(users.c.face_encoding.isnot(None))).fetchall()
+    for user_id, blob in rows:
+        blob = bytes(blob)
+        if blob[:2] != MAGIC:
+            continue  # still pickled
+        _, _, _, dim, _ = HEADER.unpack_from(blob)
+        values = np.frombuffer(blob, dtype='<f4', count=dim, offset=HEADER.size)
+        conn.execute(users.update().where(users.c.id == user_id).values(face_encoding=pickle.dumps(values.astype(float).tolist())))
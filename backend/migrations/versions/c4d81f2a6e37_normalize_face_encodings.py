@@ -0,0 +1,69 @@
+"""Store face encodings L2-normalized with their original norm
+
+Revision ID: c4d81f2a6e37
+Revises: 7b2e4c91d0a5
+Create Date: 2026-10-18 10:03:17.552901
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import struct
+import numpy as np
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d81f2a6e37'
+down_revision = '7b2e4c91d0a5'
+branch_labels = None
+depends_on = None
+
+# Mirrors app.models.types
+HEADER = struct.Struct('<2sBBHH')
+FLAG_NORMALIZED = 0x01
+
+users = sa.table('users',
+    sa.column('id', sa.Integer),
+    sa.column('face_encoding', sa.LargeBinary),
+    sa.column('face_encoding_norm', sa.Float)
+)
+
+
+def _unpack(blob):
+    magic, version, flags, dim, model_id = HEADER.unpack_from(blob)
+    values = np.frombuffer(blob, dtype='<f4', count=dim, offset=HEADER.size)
+    return magic, version, flags, model_id, values
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('face_encoding_norm', sa.Float(), nullable=True))
+
+    # Backfill: normalize every stored embedding and remember its norm
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(users.c.id, users.c.face_encoding).where(users.c.face_encoding.isnot(None))).fetchall()
+    for user_id, blob in rows:
+        magic, version, flags, model_id, values = _unpack(bytes(blob))
+        norm = float(np.linalg.norm(values))
+        if norm > 0:
+            values = (values / norm).astype('<f4')
+            flags |= FLAG_NORMALIZED
+        packed = HEADER.pack(magic, version, flags, values.size, model_id) + values.tobytes()
+        conn.execute(users.update().where(users.c.id == user_id).values(face_encoding=packed, face_encoding_norm=norm))
+
+
+def downgrade():
+    # Restore the original magnitudes before dropping the norm column
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(users.c.id, users.c.face_encoding, users.c.face_encoding_norm)
+        .where(users.c.face_encoding.isnot(None))
+    ).fetchall()
+    for user_id, blob, norm in rows:
+        magic, version, flags, model_id, values = _unpack(bytes(blob))
+        if norm:
+            values = (values * norm).astype('<f4')
+        packed = HEADER.pack(magic, version, flags & ~FLAG_NORMALIZED, values.size, model_id) + values.tobytes()
+        conn.execute(users.update().where(users.c.id == user_id).values(face_encoding=packed))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('face_encoding_norm')
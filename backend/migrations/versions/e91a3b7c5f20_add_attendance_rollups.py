@@ -0,0 +1,48 @@
+"""Add attendance rollup table
+
+Revision ID: e91a3b7c5f20
+Revises: c4d81f2a6e37
+Create Date: 2026-10-18 13:26:51.804417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91a3b7c5f20'
+down_revision = 'c4d81f2a6e37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attendance_rollups',
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('class_id', sa.Integer(), nullable=False),
+    sa.Column('sessions_started', sa.Integer(), nullable=False),
+    sa.Column('sessions_attended', sa.Integer(), nullable=False),
+    sa.Column('last_attended_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('student_id', 'class_id')
+    )
+    with op.batch_alter_table('attendance_rollups', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_attendance_rollups_class_id'), ['class_id'], unique=False)
+
+    # Backfill from existing sessions and attendance (rebuild_rollups.py does the same on demand)
+    op.execute("""
+        INSERT INTO attendance_rollups (student_id, class_id, sessions_started, sessions_attended, last_attended_at)
+        SELECT sc.student_id, sc.class_id, COUNT(DISTINCT s.id), COUNT(DISTINCT a.id), MAX(a.timestamp)
+        FROM student_classes sc
+        LEFT JOIN attendance_sessions s ON s.class_id = sc.class_id
+        LEFT JOIN attendance a ON a.session_id = s.id AND a.student_id = sc.student_id AND a.status = 'present'
+        GROUP BY sc.student_id, sc.class_id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('attendance_rollups', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_attendance_rollups_class_id'))
+
+    op.drop_table('attendance_rollups')
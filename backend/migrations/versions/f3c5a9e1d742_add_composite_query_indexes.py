@@ -0,0 +1,42 @@
+"""Add composite indexes for history, active sessions and the face update queue
+
+Revision ID: f3c5a9e1d742
+Revises: b27e9c4d1a63
+Create Date: 2026-10-18 17:21:40.518362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c5a9e1d742'
+down_revision = 'b27e9c4d1a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('attendance', schema=None) as batch_op:
+        batch_op.create_index('ix_attendance_student_timestamp', ['student_id', 'timestamp'], unique=False)
+        batch_op.create_index('ix_attendance_student_status', ['student_id', 'status'], unique=False)
+
+    with op.batch_alter_table('attendance_sessions', schema=None) as batch_op:
+        batch_op.create_index('ix_attendance_sessions_class_active', ['class_id', 'is_active'], unique=False)
+        batch_op.create_index('ix_attendance_sessions_class_start', ['class_id', 'start_time'], unique=False)
+
+    with op.batch_alter_table('face_update_requests', schema=None) as batch_op:
+        batch_op.create_index('ix_face_update_requests_status_created', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('face_update_requests', schema=None) as batch_op:
+        batch_op.drop_index('ix_face_update_requests_status_created')
+
+    with op.batch_alter_table('attendance_sessions', schema=None) as batch_op:
+        batch_op.drop_index('ix_attendance_sessions_class_start')
+        batch_op.drop_index('ix_attendance_sessions_class_active')
+
+    with op.batch_alter_table('attendance', schema=None) as batch_op:
+        batch_op.drop_index('ix_attendance_student_status')
+        batch_op.drop_index('ix_attendance_student_timestamp')
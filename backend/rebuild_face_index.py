@@ -0,0 +1,35 @@
+"""
+Rebuild or verify the saved campus face index (FACE_INDEX_PATH).
+
+Usage:
+    python rebuild_face_index.py           # rebuild from users.face_encoding (retrains IVF centroids)
+    python rebuild_face_index.py --check   # compare the saved index to the database, exit 1 on drift
+
+Running workers reconcile their in-memory index with the database and retrain
+IVF centroids as it grows on their own; restart them after a rebuild to pick
+up the rebuilt file.
+"""
+import sys
+
+from app import create_app
+from app.services.face_index import face_index
+
+app = create_app()
+
+with app.app_context():
+    if '--check' in sys.argv:
+        print(f"🔍 Comparing {face_index.path} to the database...")
+        report = face_index.check()
+        if report['missing_file']:
+            print(f"❌ No saved {face_index.backend} index. Run without --check to build it.")
+            sys.exit(1)
+        stale, removed = report['stale'], report['removed']
+        if stale or removed:
+            print(f"❌ {len(stale)} user(s) missing or outdated, {len(removed)} no longer registered. "
+                  f"Workers fix this on load; run without --check to rewrite the file.")
+            sys.exit(1)
+        print("✅ Face index matches the database")
+    else:
+        print(f"⏳ Rebuilding {face_index.backend} face index...")
+        size = face_index.rebuild()
+        print(f"✅ Saved {size} embedding(s) to {face_index.path}")
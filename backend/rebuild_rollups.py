@@ -0,0 +1,29 @@
+"""
+Rebuild or verify the attendance_rollups table.
+
+Usage:
+    python rebuild_rollups.py           # recompute every row from attendance + sessions
+    python rebuild_rollups.py --check   # compare rollups to a full recount, exit 1 on mismatch
+"""
+import sys
+
+from app import create_app
+from app.services import rollup_service
+
+app = create_app()
+
+with app.app_context():
+    if '--check' in sys.argv:
+        print("🔍 Comparing attendance rollups to a full recount...")
+        mismatches = rollup_service.check_consistency()
+        for m in mismatches[:50]:
+            print(f"❌ student {m['student_id']} / class {m['class_id']}: "
+                  f"expected {m['expected']}, found {m['actual']}")
+        if mismatches:
+            print(f"❌ {len(mismatches)} mismatched rollup row(s). Run without --check to rebuild.")
+            sys.exit(1)
+        print("✅ Rollups are consistent")
+    else:
+        print("⏳ Rebuilding attendance rollups...")
+        count = rollup_service.rebuild()
+        print(f"✅ Rebuilt {count} rollup row(s)")
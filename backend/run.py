@@ -1,4 +1,5 @@
-from app import create_app, db
+import os
+from app import create_app, db, start_services
 from app.models.user import User
 from app.models.class_model import Class
 from app.models.attendance import Attendance
@@ -10,4 +11,7 @@ def make_shell_context():
     return {'db': db, 'User': User, 'Class': Class, 'Attendance': Attendance}
 
 if __name__ == '__main__':
+    # The debug reloader's parent only watches files; the child it spawns serves
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_services(app)
     app.run(debug=True, port=5000)
@@ -0,0 +1,43 @@
+"""
+Queue low-attendance warning emails for every student below the threshold.
+
+Usage:
+    python send_low_attendance_notifications.py                  # LOW_ATTENDANCE_THRESHOLD from config
+    python send_low_attendance_notifications.py --threshold 60
+    python send_low_attendance_notifications.py --dry-run        # list students, queue nothing
+
+Meant to run from cron, e.g. weekly:
+    0 7 * * MON  cd /path/to/backend && python send_low_attendance_notifications.py
+
+Emails are only queued here; the running backend's mail worker delivers them.
+"""
+import argparse
+
+from app import create_app
+from app.services import notification_service, rollup_service
+
+parser = argparse.ArgumentParser(description='Queue low-attendance warning emails')
+parser.add_argument('--threshold', type=float, help='attendance percentage below which students are warned')
+parser.add_argument('--min-sessions', type=int, help='skip students with fewer started sessions')
+parser.add_argument('--dry-run', action='store_true', help='only list the students that would be warned')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    print("⏳ Finding students below the attendance threshold...")
+    if args.dry_run:
+        threshold = args.threshold if args.threshold is not None else app.config['LOW_ATTENDANCE_THRESHOLD']
+        min_sessions = args.min_sessions if args.min_sessions is not None else app.config['LOW_ATTENDANCE_MIN_SESSIONS']
+        students = rollup_service.low_attendance_report(threshold, min_sessions)
+        for student in students:
+            print(f"  {student['email']:<40} {student['percentage']:>6.2f}%  {student['status']}")
+        print(f"ℹ️  Dry run: {len(students)} student(s) below {threshold}%, no emails queued")
+    else:
+        summary = notification_service.notify_low_attendance(threshold=args.threshold, min_sessions=args.min_sessions)
+        print(f"📊 {summary['students']} student(s) below {summary['threshold']}% "
+              f"(min {summary['min_sessions']} sessions): {summary['by_status']}")
+        if summary['students'] and not summary['queued']:
+            print("⚠️  Mail is not configured (MAIL_DEFAULT_SENDER); no emails queued")
+        else:
+            print(f"✅ Queued {summary['queued']} email(s)")
@@ -0,0 +1,12 @@
+"""
+Production WSGI entry point, e.g.:
+    gunicorn -w 4 -b 0.0.0.0:5000 wsgi:app
+
+Each worker builds the app and starts its serving services (face model
+warm-up, inference batcher, mail worker). Don't use --preload: the batcher and
+mail worker threads would not survive the fork.
+"""
+from app import create_app, start_services
+
+app = create_app()
+start_services(app)